@@ -1,35 +1,597 @@
 import sqlite3
+import atexit
+import bisect
 import calendar
 import math
 import os
+import queue
+import secrets
 import smtplib
 import hashlib
-from datetime import date, datetime
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from datetime import date, datetime, timezone
 from email.mime.text import MIMEText
+from urllib.parse import urlencode
 
+import click
+import numpy as np
 from dotenv import load_dotenv
-from flask import Flask, redirect, render_template, request, session
+from flask import (
+    Flask,
+    before_render_template,
+    g,
+    has_request_context,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    session,
+    template_rendered,
+)
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import timedelta
 
+import build_assets
+
 load_dotenv()
-DB_PATH = os.path.abspath('college.db')
+DB_PATH = os.path.abspath(os.getenv("DATABASE_PATH", 'college.db'))
 FALLBACK_DB_PATH = os.path.abspath('college_recovered.db')
 print('DB PATH:', DB_PATH)
 
 app = Flask(__name__)
 app.secret_key = "college-survivor-secret"
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# "synced" keeps the original behaviour for a project folder that is mirrored by a
+# sync client; "server" is meant for real deployments with a local disk.
+STORAGE_PROFILE = os.getenv("DB_STORAGE_PROFILE", "synced")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+STORAGE_PROFILES = ("synced", "server")
+
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "50"))
+SQL_SLOW_LOG = os.getenv("SQL_SLOW_LOG", "")
+SQL_TOP_N = int(os.getenv("SQL_TOP_N", "10"))
+# Secret sent as "Authorization: Bearer <token>" to read the diagnostics endpoints.
+# User names can be registered, freed and reset by anyone, so they are not used for this.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Set METRICS_DIR when several worker processes serve the app, so /metrics adds them up.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+
+def storage_pragmas(profile):
+    if profile == "synced":
+        # Memory journaling is more reliable here because the project lives in a
+        # synced folder and SQLite sidecar files were causing disk I/O issues.
+        return [
+            "PRAGMA journal_mode=MEMORY",
+            "PRAGMA temp_store=MEMORY",
+        ]
+    if profile == "server":
+        # WAL lets dashboard reads run while attendance writes commit, and
+        # synchronous=NORMAL is still crash-safe in WAL mode.
+        return [
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+            f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+            f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}",
+            "PRAGMA temp_store=MEMORY",
+        ]
+    raise ValueError(f"Unknown DB_STORAGE_PROFILE {profile!r}; expected one of {', '.join(STORAGE_PROFILES)}")
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+METRIC_HELP = {
+    "college_http_requests_total": ("counter", "Requests served, by route and status code."),
+    "college_http_request_errors_total": ("counter", "Requests that ended with a 5xx response."),
+    "college_http_request_duration_seconds": ("histogram", "Time from the start of a request to its response."),
+    "college_http_request_db_seconds": ("histogram", "Time a request spent running SQL statements."),
+    "college_db_pool_wait_seconds": ("histogram", "Time spent waiting for a pooled database connection."),
+    "college_db_pool_timeouts_total": ("counter", "Requests that gave up waiting for a pooled connection."),
+    "college_db_pool_connections": ("gauge", "Pooled database connections, by state."),
+    "college_db_write_lock_wait_seconds": ("histogram", "Time spent waiting for the SQLite write lock."),
+    "college_emails_total": ("counter", "Emails handed to the SMTP server, by result."),
+    "college_click_events_total": ("counter", "Navigation clicks recorded, by outcome."),
+    "college_click_events_buffered": ("gauge", "Clicks waiting in memory for the next flush."),
+    "college_click_flush_errors_total": ("counter", "Click log flushes that failed and were retried."),
+}
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_metric_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """Counters and histograms served by /metrics in the Prometheus text format.
+
+    An update holds one short lock. With ``directory`` set, every process
+    also writes its values to ``metrics-<pid>.json`` there every
+    ``flush_interval`` seconds, and /metrics sums all the files so gunicorn
+    workers report as one service. A worker removes its file when it exits;
+    a file that has stopped updating belongs to a worker that died without
+    doing so and is removed at the next scrape.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._writer_pid = None
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        index = bisect.bisect_left(buckets, value)
+        key = (name, labels)
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            entry[1][index] += 1
+            entry[2] += value
+
+    def add_collector(self, collect):
+        # collect() yields (kind, name, labels, value) at scrape time for values kept elsewhere.
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [
+                [name, labels, list(buckets), list(counts), total]
+                for (name, labels), (buckets, counts, total) in self._histograms.items()
+            ]
+        gauges = []
+        for collect in self._collectors:
+            for kind, name, labels, value in collect():
+                (counters if kind == "counter" else gauges).append([name, labels, value])
+        return {"written": time.time(), "counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def write_snapshot(self):
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(path + ".tmp", path)
+
+    def remove_snapshot(self):
+        # Prometheus reads the lower totals that follow as a counter reset.
+        try:
+            os.remove(os.path.join(self.directory, f"metrics-{os.getpid()}.json"))
+        except FileNotFoundError:
+            pass
+
+    def ensure_writer(self):
+        # Started lazily and per process, because threads do not survive a gunicorn fork.
+        if not self.directory or self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self._run_writer, name="metrics-writer", daemon=True).start()
+
+    def _run_writer(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError as exc:
+                print(f"Metrics write failed: {exc}")
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        os.makedirs(self.directory, exist_ok=True)
+        self.write_snapshot()
+        snapshots = []
+        stale_before = time.time() - 3 * self.flush_interval
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("metrics-") and filename.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                # Live workers rewrite their file every flush_interval, even when idle.
+                if os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+                    continue
+                with open(path, encoding="utf-8") as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in self._snapshots():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snapshot["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+            for name, labels, buckets, counts, total in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                entry = histograms.setdefault(key, [buckets, [0] * len(counts), 0.0])
+                entry[1] = [merged + count for merged, count in zip(entry[1], counts)]
+                entry[2] += total
+
+        # Series are grouped per metric name and sorted by labels; bucket lines keep their le order.
+        series = {}
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            series.setdefault(name, []).append((labels, [f"{name}{format_labels(labels)} {format_metric_value(value)}"]))
+        for (name, labels), (buckets, counts, total) in histograms.items():
+            lines = []
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += count
+                bucket_labels = labels + (("le", bound if bound == "+Inf" else format_metric_value(bound)),)
+                lines.append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_metric_value(total)}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+            series.setdefault(name, []).append((labels, lines))
+
+        output = []
+        for name in sorted(series):
+            kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+            output += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for _, lines in sorted(series[name]):
+                output += lines
+        return "\n".join(output) + "\n"
+
+
+metrics = Metrics(METRICS_DIR, METRICS_FLUSH_SECONDS)
+if METRICS_DIR:
+    atexit.register(metrics.remove_snapshot)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    # Literals and IN lists become placeholders so one query shape aggregates under one key.
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", sql)
+    return " ".join(sql.split())
+
+
+class SqlStats:
+    """Statement timings since startup, per route and per normalized SQL text.
+
+    Connections record every statement here; requests also keep their own
+    running totals in ``g`` for the Server-Timing header.
+    """
+
+    def __init__(self, slow_ms, top_n, slow_log):
+        self.slow_ms = slow_ms
+        self.top_n = top_n
+        self.slow_log = slow_log
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._routes = {}
+        self.slow_queries = 0
+
+    def record(self, sql, elapsed):
+        if has_request_context():
+            timing = g.get("sql_timing")
+            if timing is not None:
+                timing[0] += 1
+                timing[1] += elapsed
+        text = normalize_sql(sql)
+        with self._lock:
+            entry = self._queries.get(text)
+            if entry is None:
+                entry = self._queries[text] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+        if elapsed * 1000 >= self.slow_ms:
+            self.log_slow(text, elapsed)
+
+    def log_slow(self, text, elapsed):
+        route = request.path if has_request_context() else "-"
+        line = f"{datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} {elapsed * 1000:.1f}ms {route} {text}"
+        with self._lock:
+            self.slow_queries += 1
+            if self.slow_log:
+                with open(self.slow_log, "a", encoding="utf-8") as handle:
+                    handle.write(line + "\n")
+                return
+        print(f"Slow query: {line}")
+
+    def record_request(self, route, statements, db_seconds, total_seconds):
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {"requests": 0, "statements": 0, "max_statements": 0, "db": 0.0, "total": 0.0}
+            entry["requests"] += 1
+            entry["statements"] += statements
+            entry["max_statements"] = max(entry["max_statements"], statements)
+            entry["db"] += db_seconds
+            entry["total"] += total_seconds
+
+    def stats(self):
+        with self._lock:
+            routes = {
+                route: {
+                    "requests": entry["requests"],
+                    "statements_avg": round(entry["statements"] / entry["requests"], 2),
+                    "statements_max": entry["max_statements"],
+                    "db_avg_ms": round(entry["db"] * 1000 / entry["requests"], 3),
+                    "total_avg_ms": round(entry["total"] * 1000 / entry["requests"], 3),
+                }
+                for route, entry in sorted(self._routes.items())
+            }
+            slowest = sorted(self._queries.items(), key=lambda item: item[1][2], reverse=True)[: self.top_n]
+            return {
+                "slow_threshold_ms": self.slow_ms,
+                "slow_queries": self.slow_queries,
+                "routes": routes,
+                "slowest": [
+                    {
+                        "sql": text,
+                        "count": count,
+                        "avg_ms": round(total * 1000 / count, 3),
+                        "max_ms": round(longest * 1000, 3),
+                    }
+                    for text, (count, total, longest) in slowest
+                ],
+            }
 
-def get_db():
-    # Memory journaling is more reliable here because the project lives in a
-    # synced folder and SQLite sidecar files were causing disk I/O issues.
-    db = sqlite3.connect(DB_PATH)
-    db.execute('PRAGMA journal_mode=MEMORY')
-    db.execute('PRAGMA temp_store=MEMORY')
+
+sql_stats = SqlStats(SQL_SLOW_MS, SQL_TOP_N, SQL_SLOW_LOG)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            sql_stats.record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            sql_stats.record(sql, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            sql_stats.record(sql_script, time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements, including the db.execute shortcuts, go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect_db():
+    db = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        factory=InstrumentedConnection,
+    )
+    for pragma in storage_pragmas(STORAGE_PROFILE):
+        db.execute(pragma)
+    # Enforcement is per connection; the cascades declared by migration 9 depend on it.
+    db.execute("PRAGMA foreign_keys=ON")
     return db
 
 
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by request threads.
+
+    Connections are opened lazily, configured once by ``connect`` and handed
+    out to one thread at a time. Idle connections are reused LIFO so the
+    warmest connection (and its page cache) is picked first.
+    """
+
+    def __init__(self, connect, max_size, timeout):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._checkouts = 0
+        self._reuses = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            metrics.inc("college_db_pool_timeouts_total")
+            raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+        waited = time.perf_counter() - started
+        metrics.observe("college_db_pool_wait_seconds", waited, buckets=WAIT_BUCKETS)
+
+        try:
+            db = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            try:
+                db = self.connect()
+            except sqlite3.Error:
+                self._slots.release()
+                raise
+            reused = False
+
+        with self._lock:
+            self._checkouts += 1
+            if reused:
+                self._reuses += 1
+            else:
+                self._opened += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return db
+
+    def release(self, db):
+        try:
+            # A request that failed halfway must not leak its open transaction to the next borrower.
+            if db.in_transaction:
+                db.rollback()
+            self._idle.put(db)
+        except sqlite3.Error:
+            with self._lock:
+                self._opened -= 1
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        # Idle connections only; one still checked out goes away with the process.
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                db.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "open": self._opened,
+                "idle": self._idle.qsize(),
+                "in_use": self._opened - self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "reuses": self._reuses,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+
+storage_pragmas(STORAGE_PROFILE)
+print('DB STORAGE PROFILE:', STORAGE_PROFILE)
+db_pool = ConnectionPool(connect_db, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+# Registered before the click buffer's flush, so atexit runs that flush first.
+atexit.register(db_pool.close_all)
+
+
+def collect_pool_metrics():
+    stats = db_pool.stats()
+    for state in ("open", "idle", "in_use"):
+        yield "gauge", "college_db_pool_connections", (("state", state),), stats[state]
+
+
+metrics.add_collector(collect_pool_metrics)
+
+
+def get_db():
+    # One pooled connection per request; release_db hands it back on teardown.
+    if "db" not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.sql_timing = [0, 0.0]
+    g.render_seconds = 0.0
+
+
+@before_render_template.connect_via(app)
+def start_render_timing(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def stop_render_timing(sender, template, context, **extra):
+    started = g.pop("render_started", None)
+    if started is not None:
+        g.render_seconds += time.perf_counter() - started
+
+
+@app.after_request
+def record_request_timing(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    statements, db_seconds = g.sql_timing
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_seconds * 1000:.2f};desc="{statements} queries", '
+        f"render;dur={g.render_seconds * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}"
+    )
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    sql_stats.record_request(f"{request.method} {route}", statements, db_seconds, total)
+
+    metrics.ensure_writer()
+    labels = (("method", request.method), ("route", route))
+    metrics.inc("college_http_requests_total", labels + (("status", str(response.status_code)),))
+    if response.status_code >= 500:
+        metrics.inc("college_http_request_errors_total", labels)
+    metrics.observe("college_http_request_duration_seconds", total, labels)
+    metrics.observe("college_http_request_db_seconds", db_seconds, labels)
+    return response
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    db = g.pop("db", None)
+    if db is not None:
+        db_pool.release(db)
+
+
 def table_exists(db, table_name):
     cur = db.cursor()
     cur.execute(
@@ -46,7 +608,7 @@ def column_exists(db, table_name, column_name):
 
 
 def ensure_column(db, table_name, column_name, definition):
-    # Lightweight schema patching keeps older databases usable without a full migration tool.
+    # Only used by the legacy migration; new schema changes belong in MIGRATIONS.
     if not column_exists(db, table_name, column_name):
         db.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {definition}")
 
@@ -55,139 +617,383 @@ def require_login():
     return "user_id" in session
 
 
-def get_user_min_attendance(user_id, db):
-    cur = db.cursor()
-    cur.execute("SELECT min_attendance FROM settings WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    return row[0] if row and row[0] else 75
+def require_admin():
+    # Unset ADMIN_TOKEN keeps the diagnostics endpoints closed to everyone.
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(ADMIN_TOKEN) and scheme.lower() == "bearer" and secrets.compare_digest(token.strip(), ADMIN_TOKEN)
 
 
-def calculate_attendance_percentage(subject_id, db):
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT attendance_weight
-        FROM subjects
-        WHERE id = ?
+def attendance_counts(status):
+    # (total, present, absent, cancelled) contribution of one mark; None means "no mark".
+    if status is None:
+        return (0, 0, 0, 0)
+    return (1, int(status == "present"), int(status == "absent"), int(status == "cancelled"))
+
+
+def add_counts(deltas, key, counts, sign=1):
+    delta = deltas.setdefault(key, [0, 0, 0, 0])
+    for index, value in enumerate(counts):
+        delta[index] += sign * value
+
+
+def apply_attendance_deltas(db, table, key_columns, deltas):
+    keys = ", ".join(key_columns)
+    placeholders = ", ".join("?" for _ in key_columns)
+    db.executemany(
+        f"""
+        INSERT INTO {table} ({keys}, total, present, absent, cancelled)
+        VALUES ({placeholders}, ?, ?, ?, ?)
+        ON CONFLICT({keys}) DO UPDATE SET
+            total = total + excluded.total,
+            present = present + excluded.present,
+            absent = absent + excluded.absent,
+            cancelled = cancelled + excluded.cancelled
         """,
-        (subject_id,),
+        [(*key, *delta) for key, delta in deltas.items()],
     )
-    row = cur.fetchone()
-    weight = row[0] if row else 1
 
-    cur.execute(
+
+def get_subject_owners(db, subject_ids):
+    subject_ids = sorted(set(subject_ids))
+    placeholders = ", ".join("?" for _ in subject_ids)
+    cur = db.cursor()
+    cur.execute(f"SELECT id, user_id FROM subjects WHERE id IN ({placeholders})", subject_ids)
+    return dict(cur.fetchall())
+
+
+def adjust_attendance_rollups(db, changes):
+    # changes holds (subject_id, date, old_status, new_status); old_status is None for a new mark.
+    subject_deltas = {}
+    last_dates = {}
+    monthly_deltas = {}
+    daily_deltas = {}
+    owners = get_subject_owners(db, [change[0] for change in changes])
+    for subject_id, date_val, old_status, new_status in changes:
+        new_counts = attendance_counts(new_status)
+        old_counts = attendance_counts(old_status)
+        add_counts(subject_deltas, subject_id, new_counts)
+        add_counts(subject_deltas, subject_id, old_counts, sign=-1)
+        last_dates[subject_id] = max(last_dates.get(subject_id, date_val), date_val)
+
+        user_id = owners.get(subject_id)
+        if user_id is not None:
+            add_counts(monthly_deltas, (user_id, date_val[:7]), new_counts)
+            add_counts(monthly_deltas, (user_id, date_val[:7]), old_counts, sign=-1)
+            add_counts(daily_deltas, (user_id, date_val), new_counts)
+            add_counts(daily_deltas, (user_id, date_val), old_counts, sign=-1)
+
+    db.executemany(
         """
-        SELECT COUNT(*),
-               SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
-        FROM attendance
-        WHERE subject_id = ?
-          AND status != 'cancelled'
+        INSERT INTO subject_attendance_stats (subject_id, total, present, absent, cancelled, last_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(subject_id) DO UPDATE SET
+            total = total + excluded.total,
+            present = present + excluded.present,
+            absent = absent + excluded.absent,
+            cancelled = cancelled + excluded.cancelled,
+            last_date = MAX(COALESCE(last_date, ''), excluded.last_date)
         """,
-        (subject_id,),
+        [(subject_id, *delta, last_dates[subject_id]) for subject_id, delta in subject_deltas.items()],
     )
-    total, present = cur.fetchone()
-    total = total or 0
-    present = present or 0
+    apply_attendance_deltas(db, "user_attendance_monthly", ("user_id", "month"), monthly_deltas)
+    apply_attendance_deltas(db, "user_attendance_daily", ("user_id", "date"), daily_deltas)
+
+
+def begin_write(db):
+    # Take the write lock before reading state that a write depends on, so two
+    # requests cannot both read the old value and apply the same counter delta.
+    if not db.in_transaction:
+        started = time.perf_counter()
+        db.execute("BEGIN IMMEDIATE")
+        metrics.observe("college_db_write_lock_wait_seconds", time.perf_counter() - started, buckets=WAIT_BUCKETS)
+
+
+def bump_data_version(db, user_id):
+    # Called inside each write route's transaction; anything cached against the
+    # old version (study plans, page ETags) stops matching once it commits.
+    db.execute("UPDATE users SET data_version = data_version + 1 WHERE id = ?", (user_id,))
+    if has_request_context():
+        g.pop("user_context", None)
+
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Preferred first: brotli is smaller than gzip for the same bundle.
+ASSET_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def load_asset_manifest():
+    # Deploys run build_assets.py once, and then this only checks the manifest's age.
+    # A checkout with newer sources is rebuilt under a file lock, by one worker only.
+    build_assets.build_if_stale()
+    manifest = build_assets.read_manifest()
+    # Bundles of the previous build stay servable for pages rendered before a deploy.
+    servable = {*manifest.values(), *build_assets.read_manifest(name=build_assets.PREVIOUS_MANIFEST_NAME).values()}
+    return build_assets.OUTPUT_DIR, manifest, servable
+
+
+ASSET_DIR, asset_manifest, servable_assets = load_asset_manifest()
+
+
+@app.template_global()
+def asset_url(name):
+    # Hashed file names change with their content, so browsers may keep them forever.
+    return f"/dist/{asset_manifest[name]}"
+
+
+@app.route("/dist/<filename>")
+def dist_asset(filename):
+    path = os.path.join(ASSET_DIR, filename)
+    if filename not in servable_assets or not os.path.exists(path):
+        return "", 404
+
+    encoding = None
+    for candidate, suffix in ASSET_ENCODINGS:
+        if candidate in request.accept_encodings and os.path.exists(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    mimetype = "text/css" if filename.endswith(".css") else "text/javascript"
+    response = send_file(path, mimetype=mimetype, max_age=ASSET_MAX_AGE, conditional=True, etag=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compute_build_id():
+    # Pages are cached by the browser against their ETag, so a deploy that
+    # changes the code, templates or static files has to change every ETag.
+    digest = hashlib.sha256()
+    for folder in (app.template_folder, app.static_folder):
+        for root, dirs, files in os.walk(os.path.join(app.root_path, folder)):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(root, name), "rb") as handle:
+                    digest.update(handle.read())
+    with open(os.path.abspath(__file__), "rb") as handle:
+        digest.update(handle.read())
+    return digest.hexdigest()[:16]
+
+
+PAGE_BUILD_ID = compute_build_id()
+
+
+def page_etag(user_id):
+    # A page is fully determined by the user's rows (data_version), the day it is
+    # rendered on and its URL. The dashboard compares against the UTC date, which
+    # can roll over separately from the local one.
+    parts = (
+        PAGE_BUILD_ID,
+        user_id,
+        get_user_context().data_version,
+        date.today().isoformat(),
+        datetime.now(timezone.utc).date().isoformat(),
+        request.full_path,
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
 
-    # Attendance can represent lectures/labs with different hour weights,
-    # so percentages are based on weighted hours instead of raw class count.
-    total_hours = total * weight
-    present_hours = present * weight
 
-    if total_hours == 0:
-        return 100
+def conditional_page(view):
+    # A reload of an unchanged page gets a 304 before the view runs any of its
+    # aggregation queries; checking costs only the user context read.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or not require_login():
+            return view(*args, **kwargs)
 
-    return round((present_hours / total_hours) * 100, 2)
+        etag = page_etag(session["user_id"])
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Cookie")
+        return response
+
+    return wrapper
+
+
+ATTENDANCE_STATUSES = ("present", "absent", "cancelled")
+MAX_ATTENDANCE_BATCH = 500
+
+
+def parse_attendance_marks(items):
+    # Returns (marks, error); a batch is rejected whole rather than half-applied.
+    if not isinstance(items, list) or not items:
+        return None, "Expected a non-empty list of marks"
+    if len(items) > MAX_ATTENDANCE_BATCH:
+        return None, f"At most {MAX_ATTENDANCE_BATCH} marks per batch"
+
+    marks = {}
+    for item in items:
+        try:
+            subject_id = int(item["subject_id"])
+            date_val = date.fromisoformat(item["date"]).isoformat()
+            status = item["status"]
+        except (KeyError, TypeError, ValueError):
+            return None, f"Invalid mark: {item!r}"
+        if status not in ATTENDANCE_STATUSES:
+            return None, f"Invalid status: {status!r}"
+        # A later click on the same cell wins, exactly as if the marks were sent one by one.
+        marks[(subject_id, date_val)] = status
+    return [(subject_id, date_val, status) for (subject_id, date_val), status in marks.items()], None
+
+
+def get_owned_subject_ids(db, user_id, subject_ids):
+    subject_ids = sorted(set(subject_ids))
+    placeholders = ", ".join("?" for _ in subject_ids)
+    cur = db.cursor()
+    cur.execute(
+        f"SELECT id FROM subjects WHERE user_id = ? AND id IN ({placeholders})",
+        (user_id, *subject_ids),
+    )
+    return {row[0] for row in cur.fetchall()}
 
 
-def classes_can_skip(subject_id, db):
+def record_attendance_marks(db, marks):
+    # Callers commit, so the marks and their counters land in the same transaction.
+    begin_write(db)
     cur = db.cursor()
+    pairs = ", ".join("(?, ?)" for _ in marks)
     cur.execute(
-        """
-        SELECT COUNT(*), SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
+        f"""
+        WITH marks(subject_id, date) AS (VALUES {pairs})
+        SELECT attendance.subject_id, attendance.date, attendance.status
         FROM attendance
-        WHERE subject_id = ? AND status != 'cancelled'
+        JOIN marks ON marks.subject_id = attendance.subject_id AND marks.date = attendance.date
         """,
-        (subject_id,),
+        [value for subject_id, date_val, _ in marks for value in (subject_id, date_val)],
     )
-    total, present = cur.fetchone()
-    total = total or 0
-    present = present or 0
+    old_statuses = {(subject_id, date_val): status for subject_id, date_val, status in cur.fetchall()}
 
-    cur.execute(
-        "SELECT attendance_required_percent FROM subjects WHERE id = ?",
-        (subject_id,),
+    # Upserting keeps attendance idempotent for a given subject/date pair.
+    cur.executemany(
+        """
+        INSERT INTO attendance (subject_id, date, status)
+        VALUES (?, ?, ?)
+        ON CONFLICT(subject_id, date) DO UPDATE SET status = excluded.status
+        """,
+        marks,
+    )
+    adjust_attendance_rollups(
+        db,
+        [
+            (subject_id, date_val, old_statuses.get((subject_id, date_val)), status)
+            for subject_id, date_val, status in marks
+        ],
     )
-    row = cur.fetchone()
-    required = row[0] if row and row[0] else 75
 
-    if total == 0:
-        return 0
 
-    # Rearranged from the minimum attendance formula so we can show a "safe skips left" number.
-    max_absences = int((100 - required) * total / required)
-    current_absences = total - present
-    return max(0, max_absences - current_absences)
+def record_attendance(db, subject_id, date_val, status):
+    record_attendance_marks(db, [(subject_id, date_val, status)])
 
 
-def has_urgent_deadline(subject_id, db):
+def remove_subject_from_rollups(db, subject_id):
+    # Take the subject's marks back out of its owner's rollups before the rows cascade away.
     cur = db.cursor()
-    today = date.today()
     cur.execute(
         """
-        SELECT due_date FROM deadlines
-        WHERE subject_id = ? AND completed = 0
+        SELECT subjects.user_id,
+               attendance.date,
+               COUNT(*),
+               SUM(CASE WHEN attendance.status = 'present' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN attendance.status = 'absent' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN attendance.status = 'cancelled' THEN 1 ELSE 0 END)
+        FROM attendance
+        JOIN subjects ON subjects.id = attendance.subject_id
+        WHERE attendance.subject_id = ?
+        GROUP BY 1, 2
         """,
         (subject_id,),
     )
-    for (due_date,) in cur.fetchall():
-        days_left = (date.fromisoformat(due_date) - today).days
-        if 0 <= days_left <= 3:
-            return True
-    return False
-
+    monthly_deltas = {}
+    daily_deltas = {}
+    for user_id, date_val, *counts in cur.fetchall():
+        add_counts(monthly_deltas, (user_id, date_val[:7]), counts, sign=-1)
+        add_counts(daily_deltas, (user_id, date_val), counts, sign=-1)
+    apply_attendance_deltas(db, "user_attendance_monthly", ("user_id", "month"), monthly_deltas)
+    apply_attendance_deltas(db, "user_attendance_daily", ("user_id", "date"), daily_deltas)
+
+
+ATTENDANCE_COUNT_COLUMNS = """
+           COUNT(*),
+           SUM(CASE WHEN attendance.status = 'present' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN attendance.status = 'absent' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN attendance.status = 'cancelled' THEN 1 ELSE 0 END)
+"""
 
-def has_assignment_overload(subject_id, db):
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT COUNT(*) FROM deadlines
-        WHERE subject_id = ? AND type = 'assignment' AND completed = 0
+# Tables derived from attendance: (table, key columns, value columns, query recomputing them from raw rows).
+ATTENDANCE_ROLLUPS = [
+    (
+        "subject_attendance_stats",
+        ("subject_id",),
+        ("total", "present", "absent", "cancelled", "last_date"),
+        f"""
+        SELECT attendance.subject_id, {ATTENDANCE_COUNT_COLUMNS}, MAX(attendance.date)
+        FROM attendance
+        GROUP BY attendance.subject_id
         """,
-        (subject_id,),
-    )
-    return cur.fetchone()[0] > 2
+    ),
+    (
+        "user_attendance_monthly",
+        ("user_id", "month"),
+        ("total", "present", "absent", "cancelled"),
+        f"""
+        SELECT subjects.user_id, substr(attendance.date, 1, 7), {ATTENDANCE_COUNT_COLUMNS}
+        FROM attendance
+        JOIN subjects ON subjects.id = attendance.subject_id
+        GROUP BY 1, 2
+        """,
+    ),
+    (
+        "user_attendance_daily",
+        ("user_id", "date"),
+        ("total", "present", "absent", "cancelled"),
+        f"""
+        SELECT subjects.user_id, attendance.date, {ATTENDANCE_COUNT_COLUMNS}
+        FROM attendance
+        JOIN subjects ON subjects.id = attendance.subject_id
+        GROUP BY 1, 2
+        """,
+    ),
+]
+
+
+def rebuild_attendance_stats(db, tables=None):
+    for table, key_columns, value_columns, select_sql in ATTENDANCE_ROLLUPS:
+        if tables is not None and table not in tables:
+            continue
+        db.execute(f"DELETE FROM {table}")
+        db.execute(f"INSERT INTO {table} ({', '.join(key_columns + value_columns)}) {select_sql}")
 
 
-def get_subject_attendance_snapshot(subject_id, db):
+def verify_attendance_stats(db):
     cur = db.cursor()
-    cur.execute(
-        """
-        SELECT attendance_required_percent, attendance_weight, name
-        FROM subjects
-        WHERE id = ?
-        """,
-        (subject_id,),
-    )
-    row = cur.fetchone()
-    if not row:
-        return None
+    mismatches = []
+    for table, key_columns, value_columns, select_sql in ATTENDANCE_ROLLUPS:
+        width = len(key_columns)
+        cur.execute(select_sql)
+        expected = {tuple(row[:width]): tuple(row[width:]) for row in cur.fetchall()}
+        cur.execute(f"SELECT {', '.join(key_columns + value_columns)} FROM {table}")
+        # A row whose counts have dropped to zero is the same as no row at all.
+        stored = {tuple(row[:width]): tuple(row[width:]) for row in cur.fetchall() if row[width]}
+
+        for key in sorted(set(expected) | set(stored)):
+            if expected.get(key) != stored.get(key):
+                mismatches.append(
+                    {"table": table, "key": key, "expected": expected.get(key), "stored": stored.get(key)}
+                )
+    return mismatches
 
-    required, weight, name = row
+
+def build_attendance_snapshot(subject_id, name, required, weight, total, present):
     required = required or 75
     weight = weight or 1
-
-    cur.execute(
-        """
-        SELECT COUNT(*),
-               SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
-        FROM attendance
-        WHERE subject_id = ?
-          AND status != 'cancelled'
-        """,
-        (subject_id,),
-    )
-    total, present = cur.fetchone()
     total = total or 0
     present = present or 0
 
@@ -195,6 +1001,13 @@ def get_subject_attendance_snapshot(subject_id, db):
     present_hours = present * weight
     percentage = round((present_hours / total_hours) * 100, 2) if total_hours else 100
 
+    # Rearranged from the minimum attendance formula so we can show a "safe skips left" number.
+    if total == 0:
+        skip_left = 0
+    else:
+        max_absences = int((100 - required) * total / required)
+        skip_left = max(0, max_absences - (total - present))
+
     return {
         "subject_id": subject_id,
         "name": name,
@@ -203,15 +1016,11 @@ def get_subject_attendance_snapshot(subject_id, db):
         "total": total,
         "present": present,
         "percentage": percentage,
-        "skip_left": classes_can_skip(subject_id, db),
+        "skip_left": skip_left,
     }
 
 
-def get_attendance_forecast(subject_id, db):
-    snapshot = get_subject_attendance_snapshot(subject_id, db)
-    if not snapshot:
-        return None
-
+def build_attendance_forecast(snapshot):
     total = snapshot["total"]
     present = snapshot["present"]
     required = snapshot["required"]
@@ -261,30 +1070,543 @@ def get_attendance_forecast(subject_id, db):
     }
 
 
-def get_exam_countdown(user_id, db, limit=4):
+def sql_placeholders(values):
+    # IN (NULL) matches nothing, so an empty list still makes valid SQL.
+    return ", ".join("?" for _ in values) or "NULL"
+
+
+def user_filter(column, user_ids):
+    # None means "every user"; report jobs pass explicit batches of ids.
+    if user_ids is None:
+        return "", ()
+    user_ids = list(user_ids)
+    return f"AND {column} IN ({sql_placeholders(user_ids)})", tuple(user_ids)
+
+
+def get_attendance_forecasts_by_user(db, user_ids=None):
+    # One pass over the subjects and their counters rows, rather than a few
+    # queries per subject.
+    user_clause, params = user_filter("subjects.user_id", user_ids)
     cur = db.cursor()
-    today = date.today()
     cur.execute(
-        """
-        SELECT deadlines.id,
+        f"""
+        SELECT subjects.user_id,
+               subjects.id,
+               subjects.name,
+               subjects.attendance_required_percent,
+               subjects.attendance_weight,
+               stats.total - stats.cancelled,
+               stats.present
+        FROM subjects
+        LEFT JOIN subject_attendance_stats AS stats ON stats.subject_id = subjects.id
+        WHERE 1 = 1 {user_clause}
+        ORDER BY subjects.user_id, subjects.id
+        """,
+        params,
+    )
+    forecasts = {}
+    for user_id, subject_id, name, required, weight, total, present in cur.fetchall():
+        snapshot = build_attendance_snapshot(subject_id, name, required, weight, total, present)
+        forecasts.setdefault(user_id, {})[subject_id] = build_attendance_forecast(snapshot)
+    return forecasts
+
+
+class ClassSchedule:
+    """A user's timetable indexed for expanding class occurrences over any date range.
+
+    Recurring classes are bucketed by weekday and extra classes by date, so
+    listing the classes of a day is two dict lookups and expanding a range costs
+    one step per day plus one per occurrence returned.
+    """
+
+    def __init__(self, entries):
+        self.by_weekday = [[] for _ in range(7)]
+        self.extras_by_date = {}
+        for entry in entries:
+            if entry["is_extra"] == 1:
+                if entry["class_date"]:
+                    self.extras_by_date.setdefault(entry["class_date"], []).append(entry)
+            elif 0 <= entry["weekday"] <= 6:
+                self.by_weekday[entry["weekday"]].append(entry)
+
+    def on(self, day):
+        recurring = self.by_weekday[day.weekday()]
+        extras = self.extras_by_date.get(day.isoformat())
+        if not extras:
+            return list(recurring)
+        # Keep timetable order, as if the rows had been filtered one by one.
+        return sorted(recurring + extras, key=lambda entry: entry["id"])
+
+    def occurrences(self, start, end):
+        """Yield (day, entry) for every class from start up to and including end."""
+        day = start
+        while day <= end:
+            for entry in self.on(day):
+                yield day, entry
+            day += timedelta(days=1)
+
+    def has_class(self, subject_id, day):
+        return any(entry["subject_id"] == subject_id for entry in self.on(day))
+
+
+class UserContext:
+    """The logged-in user's subjects, settings and timetable for one request.
+
+    Routes and helpers share it through get_user_context() instead of each
+    querying subjects and settings again. The user row, settings and subjects
+    (with their attendance counters) come from one query the first time any
+    of them is used; the timetable is read separately, only when needed.
+    """
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+        self._loaded = False
+        self._data_version = 0
+        self._min_attendance = 75
+        self._subjects = []
+        self._subject_names = {}
+        self._timetable = None
+        self._schedule = None
+        self._forecasts = None
+
+    def _load(self):
+        if self._loaded:
+            return
+        cur = self.db.cursor()
+        cur.execute(
+            """
+            SELECT users.data_version,
+                   settings.min_attendance,
+                   subjects.id,
+                   subjects.name,
+                   subjects.credits,
+                   subjects.attendance_required_percent,
+                   subjects.attendance_weight,
+                   stats.total - stats.cancelled,
+                   stats.present
+            FROM users
+            LEFT JOIN settings ON settings.user_id = users.id
+            LEFT JOIN subjects ON subjects.user_id = users.id
+            LEFT JOIN subject_attendance_stats AS stats ON stats.subject_id = subjects.id
+            WHERE users.id = ?
+            ORDER BY subjects.id
+            """,
+            (self.user_id,),
+        )
+        for data_version, min_attendance, subject_id, name, credits, required, weight, total, present in cur.fetchall():
+            self._data_version = data_version
+            self._min_attendance = min_attendance or 75
+            if subject_id is None:
+                continue
+            self._subjects.append(
+                {
+                    "id": subject_id,
+                    "name": name,
+                    "credits": credits,
+                    "required": required,
+                    "weight": weight,
+                    "total": total,
+                    "present": present,
+                }
+            )
+            self._subject_names[subject_id] = name
+        self._loaded = True
+
+    @property
+    def data_version(self):
+        self._load()
+        return self._data_version
+
+    @property
+    def min_attendance(self):
+        self._load()
+        return self._min_attendance
+
+    @property
+    def subjects(self):
+        self._load()
+        return self._subjects
+
+    @property
+    def subject_ids(self):
+        return [subject["id"] for subject in self.subjects]
+
+    @property
+    def subject_names(self):
+        self._load()
+        return self._subject_names
+
+    def owns(self, subject_id):
+        return subject_id in self.subject_names
+
+    @property
+    def timetable(self):
+        if self._timetable is None:
+            subject_ids = self.subject_ids
+            cur = self.db.cursor()
+            cur.execute(
+                f"""
+                SELECT id, subject_id, weekday, is_extra, class_date, start_time, end_time, room
+                FROM timetable
+                WHERE subject_id IN ({sql_placeholders(subject_ids)})
+                ORDER BY id
+                """,
+                subject_ids,
+            )
+            columns = ("id", "subject_id", "weekday", "is_extra", "class_date", "start_time", "end_time", "room")
+            self._timetable = [dict(zip(columns, row)) for row in cur.fetchall()]
+        return self._timetable
+
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self._schedule = ClassSchedule(self.timetable)
+        return self._schedule
+
+    def classes_on(self, day):
+        # A class comes either from the recurring weekday timetable or from a one-off extra class.
+        return self.schedule.on(day)
+
+    @property
+    def forecasts(self):
+        if self._forecasts is None:
+            self._forecasts = {
+                subject["id"]: build_attendance_forecast(
+                    build_attendance_snapshot(
+                        subject["id"],
+                        subject["name"],
+                        subject["required"],
+                        subject["weight"],
+                        subject["total"],
+                        subject["present"],
+                    )
+                )
+                for subject in self.subjects
+            }
+        return self._forecasts
+
+
+def get_user_context():
+    if "user_context" not in g:
+        g.user_context = UserContext(get_db(), session["user_id"])
+    return g.user_context
+
+
+SEMESTER_END = os.getenv("SEMESTER_END", "")
+FORECAST_DEFAULT_DAYS = 120
+FORECAST_MAX_DAYS = 366
+
+
+def build_occurrence_matrix(schedule, subject_ids, start, end):
+    # counts[s, d] is how many classes subject_ids[s] has on day start + d.
+    days = (end - start).days + 1
+    counts = np.zeros((len(subject_ids), days), dtype=np.int64)
+    row_of = {subject_id: index for index, subject_id in enumerate(subject_ids)}
+    rows, columns = [], []
+    for day, entry in schedule.occurrences(start, end):
+        if entry["subject_id"] in row_of:
+            rows.append(row_of[entry["subject_id"]])
+            columns.append((day - start).days)
+    np.add.at(counts, (rows, columns), 1)
+    return counts
+
+
+def project_final_attendance(present, total, counts, skipped):
+    # Percentage at the end of the range when every remaining class except the skipped ones is attended.
+    remaining = counts.sum(axis=1)
+    final_total = total + remaining
+    final_present = present + remaining - skipped
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentage = np.where(final_total > 0, final_present * 100 / final_total, 100.0)
+    return np.round(percentage, 2)
+
+
+def project_semester_attendance(context, start, end, skips_per_week=(), skip_dates=()):
+    """Project every subject's final attendance from the classes left until end.
+
+    All subjects are handled together as arrays: one row per subject, one column
+    per day. Scenarios are attending everything, skipping up to N classes each
+    week, and skipping the given dates. For each subject, safe_skips is how many
+    classes can still be missed while finishing at the required percentage, and
+    latest_safe_skip_dates are the last class days that fit in that budget.
+    """
+    subjects = context.subjects
+    subject_ids = [subject["id"] for subject in subjects]
+    present = np.array([subject["present"] or 0 for subject in subjects], dtype=np.int64)
+    total = np.array([subject["total"] or 0 for subject in subjects], dtype=np.int64)
+    required = np.array([subject["required"] or 75 for subject in subjects], dtype=np.int64)
+
+    counts = build_occurrence_matrix(context.schedule, subject_ids, start, end)
+    remaining = counts.sum(axis=1)
+    no_skips = np.zeros(len(subjects), dtype=np.int64)
+
+    # Split the days into Monday-based weeks, then cap each week's skips at N.
+    week_of_day = (np.arange(counts.shape[1]) + start.weekday()) // 7
+    week_starts = np.flatnonzero(np.diff(week_of_day, prepend=-1))
+    weekly = np.add.reduceat(counts, week_starts, axis=1) if counts.size else counts
+    per_week = {
+        skips: project_final_attendance(present, total, counts, np.minimum(weekly, skips).sum(axis=1))
+        for skips in skips_per_week
+    }
+
+    date_columns = sorted({(day - start).days for day in skip_dates if start <= day <= end})
+    on_dates = project_final_attendance(present, total, counts, counts[:, date_columns].sum(axis=1))
+
+    # Largest k with 100 * (present + remaining - k) >= required * (total + remaining), in integers.
+    budget = np.floor_divide(100 * (present + remaining) - required * (total + remaining), 100)
+    safe_skips = np.clip(budget, 0, remaining)
+    # Classes on or after each day; a day is a safe skip if it and every later class fit in the budget.
+    classes_from_day = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+    safe_days = (counts > 0) & (classes_from_day <= safe_skips[:, None])
+
+    attend_all = project_final_attendance(present, total, counts, no_skips)
+    projections = []
+    for index, subject in enumerate(subjects):
+        projections.append(
+            {
+                "subject_id": subject["id"],
+                "name": subject["name"],
+                "required": int(required[index]),
+                "present": int(present[index]),
+                "total": int(total[index]),
+                "remaining_classes": int(remaining[index]),
+                "attend_all": float(attend_all[index]),
+                "skip_per_week": {str(skips): float(values[index]) for skips, values in per_week.items()},
+                "skip_dates": float(on_dates[index]),
+                "reachable": bool(budget[index] >= 0),
+                "safe_skips": int(safe_skips[index]),
+                "latest_safe_skip_dates": [
+                    (start + timedelta(days=int(column))).isoformat() for column in np.flatnonzero(safe_days[index])
+                ],
+            }
+        )
+    return projections
+
+
+def get_weekly_attendance_counts(db, user_ids=None):
+    # This week is the last seven days; last week is the seven days before that.
+    user_clause, params = user_filter("subjects.user_id", user_ids)
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        SELECT subjects.user_id,
+               SUM(CASE WHEN attendance.date >= date('now', '-6 days') THEN 1 ELSE 0 END),
+               SUM(CASE WHEN attendance.date >= date('now', '-6 days')
+                         AND attendance.status = 'present' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN attendance.date <= date('now', '-7 days') THEN 1 ELSE 0 END),
+               SUM(CASE WHEN attendance.date <= date('now', '-7 days')
+                         AND attendance.status = 'present' THEN 1 ELSE 0 END)
+        FROM attendance
+        JOIN subjects ON subjects.id = attendance.subject_id
+        WHERE attendance.date >= date('now', '-13 days')
+          AND attendance.status != 'cancelled'
+          {user_clause}
+        GROUP BY subjects.user_id
+        """,
+        params,
+    )
+    return {row[0]: tuple(value or 0 for value in row[1:]) for row in cur.fetchall()}
+
+
+def summarize_attendance(forecasts, weekly_counts):
+    # Shared by the dashboard and the weekly report so both show the same figures.
+    subjects_at_risk = 0
+    attendance_values = []
+    recovery_subjects = 0
+    for forecast in forecasts:
+        pct = forecast["percentage"]
+        attendance_values.append(pct)
+        if pct < 80:
+            subjects_at_risk += 1
+        if forecast["status"] in {"recover", "edge"}:
+            recovery_subjects += 1
+
+    overall_attendance = round(sum(attendance_values) / len(attendance_values), 1) if attendance_values else 0
+    safe_subjects = len(attendance_values) - subjects_at_risk
+
+    total, present, last_total, last_present = weekly_counts
+    weekly_attendance = round((present / total) * 100) if total else 0
+    last_week_attendance = round((last_present / last_total) * 100) if last_total else weekly_attendance
+
+    if overall_attendance == 0:
+        attendance_insight = "No attendance data yet"
+    elif overall_attendance < 75:
+        attendance_insight = "Attendance is critically low"
+    elif overall_attendance < 80:
+        attendance_insight = "Attendance needs attention"
+    elif weekly_attendance > last_week_attendance:
+        attendance_insight = "You attended more classes than last week"
+    elif weekly_attendance < last_week_attendance:
+        attendance_insight = "Attendance dropped compared to last week"
+    else:
+        attendance_insight = "Attendance stayed the same as last week"
+
+    return {
+        "subjects_at_risk": subjects_at_risk,
+        "safe_subjects": safe_subjects,
+        "recovery_subjects": recovery_subjects,
+        "overall_attendance": overall_attendance,
+        "weekly_attendance": weekly_attendance,
+        "last_week_attendance": last_week_attendance,
+        "attendance_insight": attendance_insight,
+    }
+
+
+def get_upcoming_deadlines_by_user(db, user_ids=None):
+    user_clause, params = user_filter("subjects.user_id", user_ids)
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        SELECT subjects.user_id,
                deadlines.title,
                deadlines.due_date,
+               deadlines.type,
                deadlines.priority,
                subjects.name
         FROM deadlines
         JOIN subjects ON deadlines.subject_id = subjects.id
-        WHERE subjects.user_id = ?
-          AND deadlines.completed = 0
-          AND LOWER(COALESCE(deadlines.type, '')) = 'exam'
-          AND deadlines.due_date >= ?
-        ORDER BY deadlines.due_date
+        WHERE deadlines.completed = 0
+          AND deadlines.due_date BETWEEN date('now') AND date('now', '+7 days')
+          {user_clause}
+        ORDER BY subjects.user_id, deadlines.due_date, deadlines.id
+        """,
+        params,
+    )
+    deadlines_by_user = {}
+    for user_id, title, due_date, deadline_type, priority, subject_name in cur.fetchall():
+        deadlines_by_user.setdefault(user_id, []).append(
+            {
+                "title": title,
+                "due_date": due_date,
+                "type": deadline_type or "task",
+                "priority": priority or "medium",
+                "subject": subject_name,
+            }
+        )
+    return deadlines_by_user
+
+
+def iter_weekly_reports(db, user_ids=None):
+    # A fixed handful of grouped queries for the whole batch, then one record per user.
+    user_clause, params = user_filter("id", user_ids)
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        SELECT id, name, email
+        FROM users
+        WHERE email IS NOT NULL AND TRIM(email) != ''
+          {user_clause}
+        ORDER BY id
+        """,
+        params,
+    )
+    users = cur.fetchall()
+    forecasts_by_user = get_attendance_forecasts_by_user(db, user_ids)
+    weekly_counts_by_user = get_weekly_attendance_counts(db, user_ids)
+    deadlines_by_user = get_upcoming_deadlines_by_user(db, user_ids)
+
+    for user_id, name, email in users:
+        forecasts = list(forecasts_by_user.get(user_id, {}).values())
+        summary = summarize_attendance(forecasts, weekly_counts_by_user.get(user_id, (0, 0, 0, 0)))
+        yield {
+            "user_id": user_id,
+            "name": name,
+            "email": email,
+            **summary,
+            "at_risk": [forecast for forecast in forecasts if forecast["percentage"] < 80],
+            "upcoming_deadlines": deadlines_by_user.get(user_id, []),
+        }
+
+
+DANGER_LOW_ATTENDANCE = 80
+DANGER_URGENT_DAYS = 3
+DANGER_OVERLOAD_ASSIGNMENTS = 2
+
+
+def classify_subject_risks(
+    db,
+    user_ids=None,
+    low_attendance=DANGER_LOW_ATTENDANCE,
+    urgent_days=DANGER_URGENT_DAYS,
+    overload_assignments=DANGER_OVERLOAD_ASSIGNMENTS,
+):
+    # One pass over subjects, their counters and their open deadlines; the
+    # weekly danger page used to run four or more queries per subject.
+    user_clause, params = user_filter("subjects.user_id", user_ids)
+    today = date.today()
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        SELECT subjects.user_id,
+               subjects.id,
+               subjects.name,
+               CASE WHEN COALESCE(stats.total - stats.cancelled, 0) = 0 THEN 100
+                    ELSE ROUND(stats.present * 100.0 / (stats.total - stats.cancelled), 2)
+               END AS percentage,
+               COALESCE(open_deadlines.urgent, 0),
+               COALESCE(open_deadlines.assignments, 0)
+        FROM subjects
+        LEFT JOIN subject_attendance_stats AS stats ON stats.subject_id = subjects.id
+        LEFT JOIN (
+            SELECT subject_id,
+                   MAX(due_date BETWEEN ? AND ?) AS urgent,
+                   SUM(type = 'assignment') AS assignments
+            FROM deadlines
+            WHERE completed = 0
+            GROUP BY subject_id
+        ) AS open_deadlines ON open_deadlines.subject_id = subjects.id
+        WHERE 1 = 1 {user_clause}
+        ORDER BY subjects.user_id, subjects.id
+        """,
+        (today.isoformat(), (today + timedelta(days=urgent_days)).isoformat(), *params),
+    )
+    risks = {}
+    for user_id, subject_id, name, percentage, urgent, assignments in cur.fetchall():
+        reasons = []
+        if percentage <= low_attendance:
+            reasons.append("Low attendance")
+        if urgent:
+            reasons.append("Urgent deadline")
+        if assignments > overload_assignments:
+            reasons.append("Assignment overload")
+        risks.setdefault(user_id, []).append(
+            {"subject_id": subject_id, "subject": name, "percentage": percentage, "reasons": reasons}
+        )
+    return risks
+
+
+def get_danger_list(db, user_id, **thresholds):
+    risks = classify_subject_risks(db, [user_id], **thresholds).get(user_id, [])
+    return [{"subject": risk["subject"], "reasons": risk["reasons"]} for risk in risks if risk["reasons"]]
+
+
+def get_exam_countdown(context, db, limit=4):
+    cur = db.cursor()
+    today = date.today()
+    subject_ids = context.subject_ids
+    cur.execute(
+        f"""
+        SELECT id, title, due_date, priority, subject_id
+        FROM deadlines
+        WHERE subject_id IN ({sql_placeholders(subject_ids)})
+          AND completed = 0
+          AND LOWER(COALESCE(type, '')) = 'exam'
+          AND due_date >= ?
+        ORDER BY due_date, id
         LIMIT ?
         """,
-        (user_id, today.isoformat(), limit),
+        (*subject_ids, today.isoformat(), limit),
     )
 
+    return format_exam_countdown(cur.fetchall(), context.subject_names, today)
+
+
+def format_exam_countdown(rows, subject_names, today):
+    # rows are (id, title, due_date, priority, subject_id) for open exams, soonest first.
     exams = []
-    for exam_id, title, due_date, priority, subject_name in cur.fetchall():
+    for exam_id, title, due_date, priority, subject_id in rows:
+        subject_name = subject_names[subject_id]
         due = date.fromisoformat(due_date)
         days_left = (due - today).days
         if days_left <= 1:
@@ -318,7 +1640,8 @@ def make_study_session_key(day_key, item_type, subject, title):
     return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
 
 
-def build_study_plan(user_id, db):
+def build_study_plan(context, db):
+    user_id = context.user_id
     cur = db.cursor()
     today = date.today()
     plan_by_date = {}
@@ -333,9 +1656,9 @@ def build_study_plan(user_id, db):
     )
     progress_map = {session_key: bool(completed) for session_key, completed in cur.fetchall()}
 
-    cur.execute("SELECT id, name FROM subjects WHERE user_id = ?", (user_id,))
-    for subject_id, name in cur.fetchall():
-        subject_names[subject_id] = name
+    forecasts = context.forecasts
+    for subject_id, forecast in forecasts.items():
+        subject_names[subject_id] = forecast["name"]
 
     for offset in range(7):
         current_day = today + timedelta(days=offset)
@@ -345,10 +1668,7 @@ def build_study_plan(user_id, db):
             "items": [],
         }
 
-    for subject_id in subject_names:
-        forecast = get_attendance_forecast(subject_id, db)
-        if not forecast:
-            continue
+    for forecast in forecasts.values():
         if forecast["status"] in {"recover", "edge", "tight"}:
             plan_by_date[today.isoformat()]["items"].append(
                 {
@@ -361,36 +1681,18 @@ def build_study_plan(user_id, db):
                 }
             )
 
-    cur.execute(
-        """
-        SELECT timetable.subject_id, timetable.weekday, timetable.class_date, timetable.is_extra
-        FROM timetable
-        JOIN subjects ON subjects.id = timetable.subject_id
-        WHERE timetable.user_id = ?
-        """,
-        (user_id,),
-    )
-    timetable_rows = cur.fetchall()
-
-    for offset in range(7):
-        current_day = today + timedelta(days=offset)
-        day_key = current_day.isoformat()
-        weekday = current_day.weekday()
-        for subject_id, saved_weekday, class_date, is_extra in timetable_rows:
-            is_match = (is_extra == 0 and saved_weekday == weekday) or (
-                is_extra == 1 and class_date == day_key
-            )
-            if is_match:
-                plan_by_date[day_key]["items"].append(
-                    {
-                        "type": "class",
-                        "subject": subject_names.get(subject_id, "Subject"),
-                        "duration": "30 min",
-                        "title": "Class follow-up",
-                        "note": "Review notes and update attendance after class.",
-                        "day_key": day_key,
-                    }
-                )
+    for class_day, entry in context.schedule.occurrences(today, today + timedelta(days=6)):
+        day_key = class_day.isoformat()
+        plan_by_date[day_key]["items"].append(
+            {
+                "type": "class",
+                "subject": subject_names.get(entry["subject_id"], "Subject"),
+                "duration": "30 min",
+                "title": "Class follow-up",
+                "note": "Review notes and update attendance after class.",
+                "day_key": day_key,
+            }
+        )
 
     cur.execute(
         """
@@ -404,7 +1706,7 @@ def build_study_plan(user_id, db):
         WHERE subjects.user_id = ?
           AND deadlines.completed = 0
           AND deadlines.due_date BETWEEN ? AND ?
-        ORDER BY deadlines.due_date
+        ORDER BY deadlines.due_date, deadlines.id
         """,
         (user_id, today.isoformat(), (today + timedelta(days=7)).isoformat()),
     )
@@ -449,157 +1751,216 @@ def build_study_plan(user_id, db):
     }
 
 
-@app.route("/")
-def home():
-    return redirect("/dashboard")
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1024"))
+PLAN_CACHE_MAX_BYTES = int(os.getenv("PLAN_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class StudyPlanCache:
+    """Per-process LRU of built study plans, bounded by entry count and approximate size.
+
+    Each user has at most one entry, tagged with the day and data version it
+    was built for, so a new day or any write makes the old plan a miss.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, tag):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != tag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, tag, plan):
+        size = len(json.dumps(plan))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[user_id] = (tag, plan, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            }
 
 
-@app.route("/dashboard")
-def dashboard():
-    if not require_login():
-        return redirect("/login")
+plan_cache = StudyPlanCache(PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_MAX_BYTES)
 
-    user_id = session["user_id"]
-    db = get_db()
-    cur = db.cursor()
-    today = date.today()
-    weekday = today.weekday()
 
-    cur.execute("SELECT id FROM subjects WHERE user_id = ?", (user_id,))
-    subject_ids = [row[0] for row in cur.fetchall()]
+def get_study_plan(context, db):
+    # The plan only depends on the user's rows and today's date. Callers must
+    # treat the returned plan as read-only because it is shared between requests.
+    tag = (date.today().isoformat(), context.data_version)
+    plan = plan_cache.get(context.user_id, tag)
+    if plan is None:
+        plan = build_study_plan(context, db)
+        plan_cache.put(context.user_id, tag, plan)
+    return plan
 
-    subjects_at_risk = 0
-    attendance_values = []
-    recovery_subjects = 0
-    for subject_id in subject_ids:
-        forecast = get_attendance_forecast(subject_id, db)
-        if not forecast:
-            continue
-        pct = forecast["percentage"]
-        attendance_values.append(pct)
-        if pct < 80:
-            subjects_at_risk += 1
-        if forecast["status"] in {"recover", "edge"}:
-            recovery_subjects += 1
 
-    overall_attendance = round(sum(attendance_values) / len(attendance_values), 1) if attendance_values else 0
-    safe_subjects = len(subject_ids) - subjects_at_risk
+TREND_MAX_POINTS = 60
+TREND_BUCKETS = {
+    "day": "date",
+    # SQLite's 'weekday 0' jumps to the coming Sunday; six days back is that week's Monday.
+    "week": "date(date, 'weekday 0', '-6 days')",
+    "month": "substr(date, 1, 7)",
+}
+
 
+def choose_trend_bucket(db, user_id, max_points=TREND_MAX_POINTS, since=None):
+    # The finest bucket whose whole series still fits in max_points.
+    cur = db.cursor()
     cur.execute(
-        """
-        SELECT COUNT(*), SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
-        FROM attendance
-        WHERE date >= date('now', '-6 days')
-          AND status != 'cancelled'
-          AND subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
+        f"""
+        SELECT COUNT(*), COUNT(DISTINCT {TREND_BUCKETS["week"]}), COUNT(DISTINCT {TREND_BUCKETS["month"]})
+        FROM user_attendance_daily
+        WHERE user_id = ? AND total > cancelled AND date >= ?
         """,
-        (user_id,),
+        (user_id, since or ""),
     )
-    total, present = cur.fetchone()
-    present = present or 0
-    weekly_attendance = round((present / total) * 100) if total else 0
+    days, weeks, _ = cur.fetchone()
+    if days <= max_points:
+        return "day"
+    if weeks <= max_points:
+        return "week"
+    return "month"
+
 
+def get_attendance_trend(db, user_id, bucket="day", since=None, max_points=TREND_MAX_POINTS):
+    # Reads the daily rollup, never raw attendance; returns the most recent max_points buckets, oldest first.
+    cur = db.cursor()
     cur.execute(
-        """
-        SELECT COUNT(*), SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
-        FROM attendance
-        WHERE date BETWEEN date('now', '-13 days') AND date('now', '-7 days')
-          AND status != 'cancelled'
-          AND subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
+        f"""
+        SELECT {TREND_BUCKETS[bucket]} AS bucket,
+               SUM(present),
+               SUM(total - cancelled)
+        FROM user_attendance_daily
+        WHERE user_id = ? AND date >= ?
+        GROUP BY bucket
+        HAVING SUM(total - cancelled) > 0
+        ORDER BY bucket DESC
+        LIMIT ?
         """,
-        (user_id,),
+        (user_id, since or "", max_points),
     )
-    last_total, last_present = cur.fetchone()
-    last_present = last_present or 0
-    last_week_attendance = round((last_present / last_total) * 100) if last_total else weekly_attendance
+    rows = cur.fetchall()
+    rows.reverse()
+    return [
+        {"bucket": key, "present": present, "total": total, "percentage": round(present * 100.0 / total)}
+        for key, present, total in rows
+    ]
+
+
+def month_bounds(year, month):
+    # Half-open [first day, first day of next month) so range scans can use the date indexes.
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start.isoformat(), end.isoformat()
 
-    if overall_attendance == 0:
-        attendance_insight = "No attendance data yet"
-    elif overall_attendance < 75:
-        attendance_insight = "Attendance is critically low"
-    elif overall_attendance < 80:
-        attendance_insight = "Attendance needs attention"
-    elif weekly_attendance > last_week_attendance:
-        attendance_insight = "You attended more classes than last week"
-    elif weekly_attendance < last_week_attendance:
-        attendance_insight = "Attendance dropped compared to last week"
-    else:
-        attendance_insight = "Attendance stayed the same as last week"
 
+@app.route("/")
+def home():
+    return redirect("/dashboard")
+
+
+@app.route("/dashboard")
+@conditional_page
+def dashboard():
+    if not require_login():
+        return redirect("/login")
+
+    user_id = session["user_id"]
+    db = get_db()
+    cur = db.cursor()
+    context = get_user_context()
+    today = date.today()
+
+    forecasts = context.forecasts
+    weekly_counts = get_weekly_attendance_counts(db, [user_id]).get(user_id, (0, 0, 0, 0))
+    summary = summarize_attendance(forecasts.values(), weekly_counts)
+
+    subject_ids = context.subject_ids
     cur.execute(
-        """
+        f"""
         SELECT COUNT(*) FROM deadlines
         WHERE completed = 0
           AND due_date BETWEEN date('now') AND date('now', '+7 days')
-          AND subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
+          AND subject_id IN ({sql_placeholders(subject_ids)})
         """,
-        (user_id,),
+        subject_ids,
     )
     urgent_deadlines = cur.fetchone()[0] or 0
 
-    cur.execute(
-        """
-        SELECT COUNT(*) FROM timetable
-        WHERE subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
-          AND (
-                weekday = ?
-                OR (is_extra = 1 AND class_date = ?)
-              )
-        """,
-        (user_id, weekday, today.isoformat()),
-    )
-    result = cur.fetchone()
-    todays_classes = result[0] if result else 0
+    todays_classes = len(context.classes_on(today))
 
-    cur.execute(
-        """
-        SELECT date,
-               SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) * 100.0 / COUNT(*)
-        FROM attendance
-        WHERE date >= date('now', '-6 days')
-          AND status != 'cancelled'
-          AND subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
-        GROUP BY date ORDER BY date
-        """,
-        (user_id,),
-    )
-    attendance_trend = [round(row[1]) for row in cur.fetchall() if row[1] is not None]
+    # SQLite's date('now') is UTC, and the daily rollup is compared against the same calendar.
+    since = (datetime.now(timezone.utc).date() - timedelta(days=6)).isoformat()
+    attendance_trend = [point["percentage"] for point in get_attendance_trend(db, user_id, "day", since=since)]
 
-    exam_countdown = get_exam_countdown(user_id, db, limit=3)
-    study_plan = build_study_plan(user_id, db)
+    exam_countdown = get_exam_countdown(context, db, limit=3)
+    study_plan = get_study_plan(context, db)
     next_study_day = next(
         (day for day in study_plan["days"] if any(not item["completed"] for item in day["items"])),
         None,
     )
 
-    db.close()
-
     return render_template(
         "dashboard.html",
-        subjects_at_risk=subjects_at_risk,
+        subjects_at_risk=summary["subjects_at_risk"],
         urgent_deadlines=urgent_deadlines,
         todays_classes=todays_classes,
-        safe_subjects=safe_subjects,
-        overall_attendance=overall_attendance,
-        weekly_attendance=weekly_attendance,
-        attendance_insight=attendance_insight,
+        safe_subjects=summary["safe_subjects"],
+        overall_attendance=summary["overall_attendance"],
+        weekly_attendance=summary["weekly_attendance"],
+        attendance_insight=summary["attendance_insight"],
         attendance_trend=attendance_trend,
         exam_countdown=exam_countdown,
-        recovery_subjects=recovery_subjects,
+        recovery_subjects=summary["recovery_subjects"],
         study_plan=study_plan,
         next_study_day=next_study_day,
     )
 
 
 @app.route("/attendance")
+@conditional_page
 def attendance():
     if not require_login():
         return redirect("/login")
 
     user_id = session["user_id"]
     today = date.today()
-    year = int(request.args.get("year", today.year))
-    month = int(request.args.get("month", today.month))
+    year_month = parse_month_args(request.args)
+    if not year_month:
+        return redirect("/attendance")
+    year, month = year_month
     month_name = calendar.month_name[month]
     month_calendar = calendar.monthcalendar(year, month)
 
@@ -620,66 +1981,48 @@ def attendance():
 
     db = get_db()
     cur = db.cursor()
+    context = get_user_context()
 
-    min_required = get_user_min_attendance(user_id, db)
+    min_required = context.min_attendance
 
+    # The monthly rollup is kept in step with every attendance write, so this is one row read.
     cur.execute(
         """
-        SELECT COUNT(*), SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END)
-        FROM attendance
-        WHERE strftime('%Y', date) = ? AND strftime('%m', date) = ?
-          AND status != 'cancelled'
-          AND subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
+        SELECT total - cancelled, present
+        FROM user_attendance_monthly
+        WHERE user_id = ? AND month = ?
         """,
-        (str(year), f"{month:02d}", user_id),
+        (user_id, f"{year:04d}-{month:02d}"),
     )
-    total, present = cur.fetchone()
-    total = total or 0
-    present = present or 0
+    row = cur.fetchone()
+    total, present = row if row else (0, 0)
 
     monthly_attendance = round((present / total) * 100) if total > 0 else 0
     required_presents = math.ceil(total * min_required / 100)
     can_miss = max(0, total - required_presents)
     month_status = "Attendance at risk" if monthly_attendance < min_required else "Attendance safe"
 
-    today_str = today.isoformat()
-
-    # A class can appear either from the recurring weekday timetable or as a one-off extra class.
-    cur.execute(
-        """
-        SELECT DISTINCT subjects.id, subjects.name
-        FROM timetable
-        JOIN subjects ON timetable.subject_id = subjects.id
-        WHERE subjects.user_id = ?
-          AND (
-                timetable.weekday = ?
-                OR (timetable.is_extra = 1 AND timetable.class_date = ?)
-              )
-        ORDER BY subjects.name
-        """,
-        (user_id, weekday_index, today_str),
+    today_subjects = sorted(
+        {(entry["subject_id"], context.subject_names[entry["subject_id"]]) for entry in context.classes_on(today)},
+        key=lambda subject: (subject[1], subject[0]),
     )
-    today_subjects = cur.fetchall()
+
+    # Only the displayed month is rendered; other months are fetched by the page on demand.
+    month_statuses = get_month_statuses(db, [subject_id for subject_id, _ in today_subjects], year, month)
 
     subjects = []
     for subject_id, name in today_subjects:
-        forecast = get_attendance_forecast(subject_id, db)
-        attendance_pct = forecast["percentage"] if forecast else calculate_attendance_percentage(subject_id, db)
-        skip_left = forecast["skip_left"] if forecast else classes_can_skip(subject_id, db)
-        cur.execute("SELECT date, status FROM attendance WHERE subject_id = ?", (subject_id,))
-        attendance_map = {attendance_date: status for attendance_date, status in cur.fetchall()}
+        forecast = context.forecasts[subject_id]
         subjects.append(
             {
                 "id": subject_id,
                 "name": name,
-                "attendance": attendance_pct,
-                "skip_left": skip_left,
-                "attendance_map": attendance_map,
+                "attendance": forecast["percentage"],
+                "skip_left": forecast["skip_left"],
+                "attendance_map": month_statuses[subject_id],
                 "forecast": forecast,
             }
-        )
-
-    db.close()
+        )
 
     return render_template(
         "attendance.html",
@@ -707,22 +2050,44 @@ def mark_attendance_ajax():
     if not require_login():
         return "", 401
 
-    data = request.json
-    subject_id = data["subject_id"]
-    date_val = data["date"]
-    status = data["status"]
+    _, error = apply_attendance_marks([request.get_json(silent=True)])
+    if error:
+        return error
+    return "", 204
+
+
+@app.route("/mark-attendance/batch", methods=["POST"])
+def mark_attendance_batch():
+    if not require_login():
+        return "", 401
+
+    payload = request.get_json(silent=True)
+    # A bare list or scalar body has no "marks"; it gets the same 400 as a bad list.
+    marks = payload.get("marks") if isinstance(payload, dict) else None
+    applied, error = apply_attendance_marks(marks)
+    if error:
+        return error
+    return jsonify({"applied": applied})
+
 
+def apply_attendance_marks(items):
+    # Returns (applied_count, error_response); every mark commits in one transaction or none do.
+    marks, error = parse_attendance_marks(items)
+    if error:
+        return 0, (jsonify({"error": error}), 400)
+
+    user_id = session["user_id"]
     db = get_db()
-    cur = db.cursor()
-    # Replacing the row keeps attendance idempotent for a given subject/date pair.
-    cur.execute("DELETE FROM attendance WHERE subject_id = ? AND date = ?", (subject_id, date_val))
-    cur.execute(
-        "INSERT INTO attendance (subject_id, date, status) VALUES (?, ?, ?)",
-        (subject_id, date_val, status),
-    )
+    # One ownership check for the whole batch so a crafted request cannot mark another user's subject.
+    subject_ids = {subject_id for subject_id, _, _ in marks}
+    foreign = sorted(subject_ids - get_owned_subject_ids(db, user_id, subject_ids))
+    if foreign:
+        return 0, (jsonify({"error": "Unknown subject", "subject_ids": foreign}), 403)
+
+    record_attendance_marks(db, marks)
+    bump_data_version(db, user_id)
     db.commit()
-    db.close()
-    return "", 204
+    return len(marks), None
 
 
 @app.route("/mark/<int:subject_id>/<status>")
@@ -734,42 +2099,14 @@ def mark_attendance(subject_id, status):
         return redirect("/attendance")
 
     db = get_db()
-    cur = db.cursor()
-    today_str = date.today().isoformat()
-    weekday = date.today().weekday()
-
-    cur.execute(
-        """
-        SELECT 1
-        FROM timetable
-        WHERE subject_id = ?
-          AND (
-                weekday = ?
-                OR (is_extra = 1 AND class_date = ?)
-              )
-        """,
-        (subject_id, weekday, today_str),
-    )
-    if not cur.fetchone():
-        db.close()
+    today = date.today()
+    # The schedule only holds the user's own subjects, so this also checks ownership.
+    if not get_user_context().schedule.has_class(subject_id, today):
         return redirect("/attendance")
 
-    cur.execute("SELECT id FROM attendance WHERE subject_id = ? AND date = ?", (subject_id, today_str))
-    existing = cur.fetchone()
-
-    if existing:
-        cur.execute(
-            "UPDATE attendance SET status = ? WHERE subject_id = ? AND date = ?",
-            (status, subject_id, today_str),
-        )
-    else:
-        cur.execute(
-            "INSERT INTO attendance (subject_id, date, status) VALUES (?, ?, ?)",
-            (subject_id, today_str, status),
-        )
-
+    record_attendance(db, subject_id, today.isoformat(), status)
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
     return redirect("/attendance")
 
 
@@ -779,26 +2116,17 @@ def attendance_calendar(subject_id):
         return redirect("/login")
 
     db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        "SELECT name FROM subjects WHERE id = ? AND user_id = ?",
-        (subject_id, session["user_id"]),
-    )
-    row = cur.fetchone()
-    if not row:
-        db.close()
+    subject_name = get_user_context().subject_names.get(subject_id)
+    if subject_name is None:
         return redirect("/subjects")
-    subject_name = row[0]
-
-    cur.execute("SELECT date, status FROM attendance WHERE subject_id = ?", (subject_id,))
-    attendance_map = {rec_date: rec_status for rec_date, rec_status in cur.fetchall()}
-    db.close()
 
     today = date.today()
+    attendance_map = get_month_statuses(db, [subject_id], today.year, today.month)[subject_id]
     cal = calendar.monthcalendar(today.year, today.month)
 
     return render_template(
         "attendance_calendar.html",
+        subject_id=subject_id,
         subject_name=subject_name,
         calendar=cal,
         attendance_map=attendance_map,
@@ -807,34 +2135,280 @@ def attendance_calendar(subject_id):
     )
 
 
-@app.route("/deadlines")
-def deadlines():
+def get_month_statuses(db, subject_ids, year, month):
+    # One bounded range scan for all requested subjects instead of each subject's whole history.
+    statuses = {subject_id: {} for subject_id in subject_ids}
+    if not statuses:
+        return statuses
+    month_start, month_end = month_bounds(year, month)
+    placeholders = ", ".join("?" for _ in statuses)
+    cur = db.cursor()
+    cur.execute(
+        f"""
+        SELECT subject_id, date, status
+        FROM attendance
+        WHERE subject_id IN ({placeholders})
+          AND date >= ? AND date < ?
+        """,
+        (*statuses, month_start, month_end),
+    )
+    for subject_id, attendance_date, status in cur.fetchall():
+        statuses[subject_id][attendance_date] = status
+    return statuses
+
+
+def parse_month_args(args):
+    today = date.today()
+    try:
+        year = int(args.get("year", today.year))
+        month = int(args.get("month", today.month))
+    except ValueError:
+        return None
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        return None
+    return year, month
+
+
+@app.route("/api/attendance/<int:subject_id>/month")
+def attendance_month_api(subject_id):
     if not require_login():
-        return redirect("/login")
+        return jsonify({"error": "Login required"}), 401
+
+    year_month = parse_month_args(request.args)
+    if not year_month:
+        return jsonify({"error": "Invalid year or month"}), 400
+    year, month = year_month
+
+    db = get_db()
+    if not get_user_context().owns(subject_id):
+        return jsonify({"error": "Unknown subject"}), 404
+
+    return jsonify(
+        {
+            "subject_id": subject_id,
+            "year": year,
+            "month": month,
+            "statuses": get_month_statuses(db, [subject_id], year, month)[subject_id],
+        }
+    )
+
+
+@app.route("/api/attendance/trend")
+def attendance_trend_api():
+    if not require_login():
+        return jsonify({"error": "Login required"}), 401
+
+    bucket = request.args.get("bucket", "auto")
+    since = request.args.get("since")
+    try:
+        max_points = min(int(request.args.get("points", TREND_MAX_POINTS)), 366)
+        if since:
+            since = date.fromisoformat(since).isoformat()
+    except ValueError:
+        return jsonify({"error": "Invalid points or since"}), 400
+    if max_points < 1 or (bucket != "auto" and bucket not in TREND_BUCKETS):
+        return jsonify({"error": "Invalid bucket or points"}), 400
 
     user_id = session["user_id"]
     db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT deadlines.id,
-               deadlines.title,
-               deadlines.due_date,
-               deadlines.type,
-               deadlines.priority,
-               deadlines.completed,
-               subjects.name
+    if bucket == "auto":
+        bucket = choose_trend_bucket(db, user_id, max_points, since)
+    return jsonify(
+        {
+            "bucket": bucket,
+            "points": get_attendance_trend(db, user_id, bucket, since=since, max_points=max_points),
+        }
+    )
+
+
+@app.route("/api/forecast")
+def forecast_api():
+    # ?from=&until=&skip_per_week=1&skip_per_week=2&skip_dates=YYYY-MM-DD,YYYY-MM-DD
+    if not require_login():
+        return jsonify({"error": "Login required"}), 401
+
+    try:
+        start = date.fromisoformat(request.args["from"]) if request.args.get("from") else date.today() + timedelta(days=1)
+        until = request.args.get("until") or SEMESTER_END
+        end = date.fromisoformat(until) if until else start + timedelta(days=FORECAST_DEFAULT_DAYS - 1)
+        skips_per_week = sorted({int(value) for value in request.args.getlist("skip_per_week")})
+        skip_dates = {
+            date.fromisoformat(value)
+            for values in request.args.getlist("skip_dates")
+            for value in values.split(",")
+            if value
+        }
+    except ValueError:
+        return jsonify({"error": "Invalid from, until, skip_per_week or skip_dates"}), 400
+    if end < start or (end - start).days >= FORECAST_MAX_DAYS:
+        return jsonify({"error": f"until must be after from and within {FORECAST_MAX_DAYS} days"}), 400
+    if len(skips_per_week) > 7 or any(not 0 <= skips <= 20 for skips in skips_per_week):
+        return jsonify({"error": "At most 7 skip_per_week values, each between 0 and 20"}), 400
+    if len(skip_dates) > FORECAST_MAX_DAYS:
+        return jsonify({"error": f"At most {FORECAST_MAX_DAYS} skip_dates"}), 400
+
+    return jsonify(
+        {
+            "from": start.isoformat(),
+            "until": end.isoformat(),
+            "subjects": project_semester_attendance(get_user_context(), start, end, skips_per_week, skip_dates),
+        }
+    )
+
+
+@app.route("/api/attendance/month")
+def attendance_months_api():
+    # Multi-subject variant for the attendance page, which pages every card's calendar together.
+    if not require_login():
+        return jsonify({"error": "Login required"}), 401
+
+    year_month = parse_month_args(request.args)
+    if not year_month:
+        return jsonify({"error": "Invalid year or month"}), 400
+    year, month = year_month
+
+    try:
+        requested = {int(subject_id) for subject_id in request.args.getlist("subject_id")}
+    except ValueError:
+        return jsonify({"error": "Invalid subject_id"}), 400
+
+    db = get_db()
+    owned = set(get_user_context().subject_ids)
+    subject_ids = owned & requested if requested else owned
+
+    statuses = get_month_statuses(db, sorted(subject_ids), year, month)
+    return jsonify(
+        {
+            "year": year,
+            "month": month,
+            "subjects": {str(subject_id): subject_statuses for subject_id, subject_statuses in statuses.items()},
+        }
+    )
+
+
+DEADLINE_PAGE_SIZE = int(os.getenv("DEADLINE_PAGE_SIZE", "30"))
+DEADLINE_ARCHIVE_DAYS = int(os.getenv("DEADLINE_ARCHIVE_DAYS", "30"))
+DEADLINE_STATUSES = ("pending", "done")
+DEADLINE_TYPES = ("assignment", "exam", "project")
+DEADLINE_PRIORITIES = ("high", "medium", "low")
+
+
+def parse_deadline_filters(args, context):
+    # Unknown values are dropped rather than rejected, so an old bookmark still shows a page.
+    filters = {}
+    if args.get("status") in DEADLINE_STATUSES:
+        filters["status"] = args["status"]
+    deadline_type = args.get("type", "").strip().lower()
+    if deadline_type:
+        filters["type"] = deadline_type[:40]
+    if args.get("priority") in DEADLINE_PRIORITIES:
+        filters["priority"] = args["priority"]
+    subject_id = args.get("subject", "")
+    if subject_id.isdigit() and context.owns(int(subject_id)):
+        filters["subject"] = int(subject_id)
+    return filters
+
+
+def parse_deadline_cursor(value):
+    # Cursors are "<due_date>,<id>" of the last row on the previous page.
+    due_date, _, deadline_id = (value or "").rpartition(",")
+    if not due_date or not deadline_id.isdigit():
+        return None
+    return due_date, int(deadline_id)
+
+
+def get_deadline_page(db, subject_ids, filters, cursor=None, archived=False, limit=DEADLINE_PAGE_SIZE):
+    # Keyset pagination on (due_date, id): each page starts right after the previous
+    # page's last row, so a page costs the same however much history sits before it.
+    # Completed deadlines due before the cutoff only show up in the archive, newest first.
+    cutoff = (date.today() - timedelta(days=DEADLINE_ARCHIVE_DAYS)).isoformat()
+    if "subject" in filters:
+        subject_ids = [filters["subject"]]
+    conditions = [f"subject_id IN ({sql_placeholders(subject_ids)})"]
+    params = list(subject_ids)
+    if archived:
+        conditions.append("completed = 1 AND due_date < ?")
+    else:
+        conditions.append("NOT (completed = 1 AND due_date < ?)")
+    params.append(cutoff)
+    if filters.get("status") == "pending":
+        conditions.append("completed = 0")
+    elif filters.get("status") == "done":
+        conditions.append("completed = 1")
+    if "type" in filters:
+        conditions.append("LOWER(COALESCE(type, '')) = ?")
+        params.append(filters["type"])
+    if "priority" in filters:
+        conditions.append("LOWER(COALESCE(priority, 'medium')) = ?")
+        params.append(filters["priority"])
+    if cursor:
+        conditions.append("(due_date, id) < (?, ?)" if archived else "(due_date, id) > (?, ?)")
+        params.extend(cursor)
+
+    direction = "DESC" if archived else "ASC"
+    rows = db.execute(
+        f"""
+        SELECT id, title, due_date, type, priority, completed, subject_id
         FROM deadlines
-        JOIN subjects ON deadlines.subject_id = subjects.id
-        WHERE subjects.user_id = ?
-        ORDER BY deadlines.due_date
+        WHERE {" AND ".join(conditions)}
+        ORDER BY due_date {direction}, id {direction}
+        LIMIT ?
         """,
-        (user_id,),
+        (*params, limit + 1),
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][2]},{rows[-1][0]}"
+    return rows, next_cursor
+
+
+def render_deadline_page(archived):
+    db = get_db()
+    context = get_user_context()
+    filters = parse_deadline_filters(request.args, context)
+    cursor = parse_deadline_cursor(request.args.get("after"))
+    rows, next_cursor = get_deadline_page(db, context.subject_ids, filters, cursor=cursor, archived=archived)
+    deadlines_list = [(*row[:6], context.subject_names[row[6]]) for row in rows]
+
+    # The countdown sits above the first page of current deadlines only.
+    exam_countdown = []
+    if not archived and cursor is None:
+        exam_countdown = get_exam_countdown(context, db, limit=6)
+
+    next_url = None
+    if next_cursor:
+        next_url = "?" + urlencode({**request.args.to_dict(), "after": next_cursor})
+    return render_template(
+        "deadlines.html",
+        deadlines=deadlines_list,
+        exam_countdown=exam_countdown,
+        archived=archived,
+        filters=filters,
+        subjects=[(subject["id"], subject["name"]) for subject in context.subjects],
+        deadline_types=DEADLINE_TYPES,
+        deadline_priorities=DEADLINE_PRIORITIES,
+        archive_days=DEADLINE_ARCHIVE_DAYS,
+        next_url=next_url,
+        first_page=cursor is None,
     )
-    deadlines_list = cur.fetchall()
-    exam_countdown = get_exam_countdown(user_id, db, limit=6)
-    db.close()
-    return render_template("deadlines.html", deadlines=deadlines_list, exam_countdown=exam_countdown)
+
+
+@app.route("/deadlines")
+@conditional_page
+def deadlines():
+    if not require_login():
+        return redirect("/login")
+    return render_deadline_page(archived=False)
+
+
+@app.route("/deadlines/archive")
+@conditional_page
+def deadlines_archive():
+    if not require_login():
+        return redirect("/login")
+    return render_deadline_page(archived=True)
 
 
 @app.route("/add-deadline", methods=["GET", "POST"])
@@ -863,7 +2437,6 @@ def add_deadline():
             (subject_id, user_id),
         )
         if not cur.fetchone():
-            db.close()
             return redirect("/deadlines")
 
         cur.execute(
@@ -874,13 +2447,11 @@ def add_deadline():
             (subject_id, title, due_date, deadline_type, priority),
         )
 
+        bump_data_version(db, session["user_id"])
         db.commit()
-        db.close()
         return redirect("/deadlines")
 
-    cur.execute("SELECT id, name FROM subjects WHERE user_id = ?", (user_id,))
-    subjects = cur.fetchall()
-    db.close()
+    subjects = [(subject["id"], subject["name"]) for subject in get_user_context().subjects]
 
     return render_template("add_deadline.html", subjects=subjects)
 
@@ -905,8 +2476,8 @@ def toggle_deadline(deadline_id):
         """,
         (deadline_id, user_id),
     )
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
     return redirect("/deadlines")
 
 
@@ -929,43 +2500,286 @@ def delete_deadline(deadline_id):
         """,
         (deadline_id, user_id),
     )
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
     return redirect("/deadlines")
 
 
-def send_email(to_email, subject, body):
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_SSL", "1") == "1"
+REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", "50"))
+REPORT_SEND_RATE = float(os.getenv("REPORT_SEND_RATE", "5"))
+REPORT_LEASE_SECONDS = int(os.getenv("REPORT_LEASE_SECONDS", "300"))
+
+# Errors that only concern one recipient; anything else means the session is unusable.
+RECIPIENT_SMTP_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def open_smtp():
+    if SMTP_USE_SSL:
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+    else:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+    # A local development sink usually runs without credentials.
+    if os.getenv("EMAIL_USER") and os.getenv("EMAIL_PASS"):
+        server.login(os.getenv("EMAIL_USER"), os.getenv("EMAIL_PASS"))
+    return server
+
+
+def send_email(to_email, subject, body, server=None):
     msg = MIMEText(body)
     msg["Subject"] = subject
     msg["From"] = os.getenv("EMAIL_USER")
     msg["To"] = to_email
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(os.getenv("EMAIL_USER"), os.getenv("EMAIL_PASS"))
-        server.sendmail(msg["From"], [to_email], msg.as_string())
+    try:
+        if server is not None:
+            server.sendmail(msg["From"], [to_email], msg.as_string())
+        else:
+            with open_smtp() as server:
+                server.sendmail(msg["From"], [to_email], msg.as_string())
+    except Exception:
+        metrics.inc("college_emails_total", (("result", "failed"),))
+        raise
+    metrics.inc("college_emails_total", (("result", "sent"),))
+
+
+def build_weekly_report_email(report):
+    subject = "Your Weekly Attendance Report"
+    lines = [
+        f"Hello {report['name']},",
+        "",
+        "Here is your weekly attendance summary from College Survivor.",
+        "",
+        f"This week: {report['weekly_attendance']}% (last week {report['last_week_attendance']}%)",
+        f"Overall: {report['overall_attendance']}%",
+        report["attendance_insight"],
+    ]
 
+    if report["at_risk"]:
+        lines += ["", "Subjects below 80%:"]
+        lines += [
+            f"  - {forecast['name']}: {forecast['percentage']}% - {forecast['headline']}"
+            for forecast in report["at_risk"]
+        ]
 
-@app.route("/send-weekly-report")
-def send_weekly_report():
-    db = get_db()
+    if report["upcoming_deadlines"]:
+        lines += ["", "Due in the next 7 days:"]
+        lines += [
+            f"  - {deadline['due_date']} {deadline['subject']}: {deadline['title']} ({deadline['type']})"
+            for deadline in report["upcoming_deadlines"]
+        ]
+
+    lines += ["", "Keep pushing", ""]
+    return subject, "\n".join(lines)
+
+
+def current_report_week(today=None):
+    year, week, _ = (today or date.today()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def enqueue_weekly_report(db, week_key):
+    # One job per ISO week, so a second trigger resumes the same job instead of mailing everyone twice.
     cur = db.cursor()
+    cur.execute(
+        "INSERT OR IGNORE INTO report_jobs (week_key, status, created_at) VALUES (?, 'queued', ?)",
+        (week_key, datetime.now().isoformat(timespec="seconds")),
+    )
+    cur.execute("UPDATE report_jobs SET status = 'queued' WHERE week_key = ? AND status = 'failed'", (week_key,))
+    cur.execute("SELECT id, status FROM report_jobs WHERE week_key = ?", (week_key,))
+    job_id, status = cur.fetchone()
+    db.commit()
+    return job_id, status
 
-    cur.execute("SELECT email, name FROM users WHERE email IS NOT NULL")
-    users = cur.fetchall()
 
-    for email, name in users:
-        subject = "Your Weekly Attendance Report"
-        body = f"""
-Hello {name},
+def claim_report_job(db, job_id):
+    # The lease lets another worker (or a restarted one) pick up a job whose runner died mid-send.
+    now = datetime.now()
+    cur = db.cursor()
+    cur.execute(
+        """
+        UPDATE report_jobs
+        SET status = 'running',
+            lease_until = ?,
+            started_at = COALESCE(started_at, ?),
+            last_error = NULL
+        WHERE id = ?
+          AND (status = 'queued' OR (status = 'running' AND lease_until < ?))
+        """,
+        (
+            (now + timedelta(seconds=REPORT_LEASE_SECONDS)).isoformat(timespec="seconds"),
+            now.isoformat(timespec="seconds"),
+            job_id,
+            now.isoformat(timespec="seconds"),
+        ),
+    )
+    db.commit()
+    return cur.rowcount == 1
+
 
-Here is your weekly attendance summary from College Survivor.
+def renew_report_lease(db, job_id):
+    lease_until = datetime.now() + timedelta(seconds=REPORT_LEASE_SECONDS)
+    db.execute(
+        "UPDATE report_jobs SET lease_until = ? WHERE id = ?",
+        (lease_until.isoformat(timespec="seconds"), job_id),
+    )
+    db.commit()
 
-Keep pushing
-"""
-        send_email(email, subject, body)
 
-    db.close()
-    return "Weekly reports sent successfully!"
+def mark_report_delivery(db, job_id, user_id, status, error=None):
+    db.execute(
+        """
+        UPDATE report_deliveries
+        SET status = ?, attempts = attempts + 1, error = ?, updated_at = ?
+        WHERE job_id = ? AND user_id = ?
+        """,
+        (status, error, datetime.now().isoformat(timespec="seconds"), job_id, user_id),
+    )
+    db.commit()
+
+
+def get_report_job_progress(db, job_id):
+    cur = db.cursor()
+    cur.execute("SELECT week_key, status, started_at, finished_at, last_error FROM report_jobs WHERE id = ?", (job_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    week_key, status, started_at, finished_at, last_error = row
+    cur.execute(
+        "SELECT status, COUNT(*) FROM report_deliveries WHERE job_id = ? GROUP BY status",
+        (job_id,),
+    )
+    counts = dict(cur.fetchall())
+    return {
+        "job_id": job_id,
+        "week": week_key,
+        "status": status,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "last_error": last_error,
+        "pending": counts.get("pending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+    }
+
+
+def run_weekly_report_job(job_id):
+    db = connect_db()
+    try:
+        if not claim_report_job(db, job_id):
+            return
+
+        # Rows that already exist keep their state, which is what makes a rerun resume.
+        db.execute(
+            """
+            INSERT OR IGNORE INTO report_deliveries (job_id, user_id, status)
+            SELECT ?, id, 'pending'
+            FROM users
+            WHERE email IS NOT NULL AND TRIM(email) != ''
+            """,
+            (job_id,),
+        )
+        db.commit()
+
+        send_interval = 1 / REPORT_SEND_RATE if REPORT_SEND_RATE > 0 else 0
+        last_sent_at = 0.0
+        cur = db.cursor()
+        while True:
+            # Same email filter as iter_weekly_reports, so every id in the batch yields a report.
+            cur.execute(
+                """
+                SELECT users.id
+                FROM report_deliveries
+                JOIN users ON users.id = report_deliveries.user_id
+                WHERE report_deliveries.job_id = ?
+                  AND report_deliveries.status = 'pending'
+                  AND users.email IS NOT NULL AND TRIM(users.email) != ''
+                ORDER BY users.id
+                LIMIT ?
+                """,
+                (job_id, REPORT_BATCH_SIZE),
+            )
+            batch = [row[0] for row in cur.fetchall()]
+            if not batch:
+                break
+
+            renew_report_lease(db, job_id)
+            reports = iter_weekly_reports(db, batch)
+            # One authenticated session per batch instead of a login per recipient.
+            with open_smtp() as server:
+                for report in reports:
+                    user_id = report["user_id"]
+                    wait = last_sent_at + send_interval - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    subject, body = build_weekly_report_email(report)
+                    try:
+                        send_email(report["email"], subject, body, server=server)
+                    except RECIPIENT_SMTP_ERRORS as exc:
+                        mark_report_delivery(db, job_id, user_id, "failed", str(exc))
+                    else:
+                        mark_report_delivery(db, job_id, user_id, "sent")
+                    last_sent_at = time.monotonic()
+
+        db.execute(
+            "UPDATE report_jobs SET status = 'done', finished_at = ?, lease_until = NULL WHERE id = ?",
+            (datetime.now().isoformat(timespec="seconds"), job_id),
+        )
+        db.commit()
+    except Exception as exc:
+        # Nothing above this thread would report the error, so record it on the job.
+        # Pending rows stay pending; triggering the report again resumes from here.
+        print(f"Weekly report job {job_id} stopped: {exc}")
+        if db.in_transaction:
+            db.rollback()
+        db.execute(
+            "UPDATE report_jobs SET status = 'failed', last_error = ?, lease_until = NULL WHERE id = ?",
+            (str(exc), job_id),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+report_workers = set()
+report_workers_lock = threading.Lock()
+
+
+def start_weekly_report_worker(job_id):
+    def work():
+        try:
+            run_weekly_report_job(job_id)
+        finally:
+            with report_workers_lock:
+                report_workers.discard(job_id)
+
+    with report_workers_lock:
+        if job_id in report_workers:
+            return False
+        report_workers.add(job_id)
+    threading.Thread(target=work, name=f"weekly-report-{job_id}", daemon=True).start()
+    return True
+
+
+@app.route("/send-weekly-report")
+def send_weekly_report():
+    db = get_db()
+    job_id, status = enqueue_weekly_report(db, current_report_week())
+    if status == "done":
+        return jsonify(get_report_job_progress(db, job_id))
+
+    start_weekly_report_worker(job_id)
+    return jsonify(get_report_job_progress(db, job_id)), 202
+
+
+@app.route("/weekly-report-status/<int:job_id>")
+def weekly_report_status(job_id):
+    progress = get_report_job_progress(get_db(), job_id)
+    if not progress:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(progress)
 
 
 @app.route("/weekly-danger")
@@ -973,24 +2787,8 @@ def weekly_danger():
     if not require_login():
         return redirect("/login")
 
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT id, name FROM subjects WHERE user_id = ?", (session["user_id"],))
-    subjects = cur.fetchall()
-
-    danger_list = []
-    for subject_id, name in subjects:
-        reasons = []
-        if calculate_attendance_percentage(subject_id, db) <= 80:
-            reasons.append("Low attendance")
-        if has_urgent_deadline(subject_id, db):
-            reasons.append("Urgent deadline")
-        if has_assignment_overload(subject_id, db):
-            reasons.append("Assignment overload")
-        if reasons:
-            danger_list.append({"subject": name, "reasons": reasons})
+    danger_list = get_danger_list(get_db(), session["user_id"])
 
-    db.close()
     return render_template("weekly_danger.html", danger_list=danger_list)
 
 
@@ -999,22 +2797,9 @@ def view_subjects():
     if not require_login():
         return redirect("/login")
 
-    user_id = session["user_id"]
-    db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT id, name, credits, attendance_required_percent, attendance_weight
-        FROM subjects WHERE user_id = ?
-        """,
-        (user_id,),
-    )
-    rows = cur.fetchall()
-    db.close()
-
     subjects = [
-        {"id": row[0], "name": row[1], "credits": row[2], "required": row[3], "weight": row[4]}
-        for row in rows
+        {key: subject[key] for key in ("id", "name", "credits", "required", "weight")}
+        for subject in get_user_context().subjects
     ]
     return render_template("subjects.html", subjects=subjects)
 
@@ -1042,11 +2827,10 @@ def add_subject():
             """,
             (user_id, name, credits, attendance_req, weight, date.today().isoformat()),
         )
+        bump_data_version(db, session["user_id"])
         db.commit()
-        db.close()
         return redirect("/subjects")
 
-    db.close()
     return render_template("add_subject.html")
 
 
@@ -1072,8 +2856,8 @@ def edit_subject(subject_id):
             """,
             (name, credits, attendance_req, weight, subject_id, user_id),
         )
+        bump_data_version(db, session["user_id"])
         db.commit()
-        db.close()
         return redirect("/subjects")
 
     cur.execute(
@@ -1085,7 +2869,6 @@ def edit_subject(subject_id):
         (subject_id, user_id),
     )
     subject = cur.fetchone()
-    db.close()
 
     if not subject:
         return redirect("/subjects")
@@ -1100,18 +2883,156 @@ def delete_subject(subject_id):
 
     db = get_db()
     cur = db.cursor()
+    begin_write(db)
     cur.execute("SELECT 1 FROM subjects WHERE id = ? AND user_id = ?", (subject_id, session["user_id"]))
     if not cur.fetchone():
-        db.close()
         return redirect("/subjects")
 
-    cur.execute("DELETE FROM attendance WHERE subject_id = ?", (subject_id,))
-    cur.execute("DELETE FROM timetable WHERE subject_id = ?", (subject_id,))
-    cur.execute("DELETE FROM deadlines WHERE subject_id = ?", (subject_id,))
-    cur.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
+    remove_subject_from_rollups(db, subject_id)
+    # Attendance, its counters, deadlines and timetable rows go with the subject through ON DELETE CASCADE.
+    cur.execute("DELETE FROM subjects WHERE id = ?", (subject_id,))
+    bump_data_version(db, session["user_id"])
+    db.commit()
+    return redirect("/subjects")
+
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+CLASS_TIME_PATTERN = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+MAX_TIMETABLE_SLOTS = 200
+
+
+def parse_timetable_slot(item):
+    # Returns (weekday, start_time, end_time, room); blank optional fields are stored as NULL.
+    weekday = int(item["weekday"])
+    start_time = (item.get("start_time") or "").strip() or None
+    end_time = (item.get("end_time") or "").strip() or None
+    room = (item.get("room") or "").strip()[:40] or None
+    if not 0 <= weekday <= 6:
+        raise ValueError(weekday)
+    for value in (start_time, end_time):
+        if value and not CLASS_TIME_PATTERN.match(value):
+            raise ValueError(value)
+    if start_time and end_time and end_time <= start_time:
+        raise ValueError(end_time)
+    return weekday, start_time, end_time, room
+
+
+def parse_weekly_timetable(subjects):
+    # Returns (schedule, error); schedule maps each subject_id to the full list of its recurring slots.
+    if not isinstance(subjects, dict) or not subjects:
+        return None, "Expected an object mapping subject ids to their classes"
+    schedule = {}
+    for subject_id, slots in subjects.items():
+        try:
+            # dict.fromkeys drops repeated slots but keeps the order they were sent in.
+            schedule[int(subject_id)] = list(dict.fromkeys(parse_timetable_slot(slot) for slot in slots))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None, f"Invalid classes for subject {subject_id!r}"
+    if sum(len(slots) for slots in schedule.values()) > MAX_TIMETABLE_SLOTS:
+        return None, f"At most {MAX_TIMETABLE_SLOTS} classes per week"
+    return schedule, None
+
+
+def timetable_editor_rows(entries):
+    # Every saved class gets a row, plus an empty row for each weekday without one,
+    # so saving the editor unchanged never drops a second class on the same day.
+    rows = [dict(entry, checked=True) for entry in entries]
+    used_days = {entry["weekday"] for entry in entries}
+    rows += [
+        {"weekday": day, "start_time": None, "end_time": None, "room": None, "checked": False}
+        for day in range(len(WEEKDAY_NAMES))
+        if day not in used_days
+    ]
+    rows.sort(key=lambda row: (row["weekday"], not row["checked"], row["start_time"] or ""))
+    return rows
+
+
+def parse_timetable_form(form, saved_entries=()):
+    # The editor posts its rows by index; only ticked rows are kept. subject_ids lists
+    # every subject on the page, so a subject with nothing ticked is cleared.
+    subjects = {}
+    for subject_id in form.getlist("subject_ids"):
+        subjects[subject_id] = [
+            {
+                "weekday": form.get(f"weekday-{subject_id}-{row}"),
+                "start_time": form.get(f"start_time-{subject_id}-{row}"),
+                "end_time": form.get(f"end_time-{subject_id}-{row}"),
+                "room": form.get(f"room-{subject_id}-{row}"),
+            }
+            for row in form.getlist(f"rows-{subject_id}")
+        ]
+    if "subject_id" in form:
+        # Single-subject form: days only, as before times and rooms existed. A day that
+        # stays ticked keeps the classes already saved on it, times and rooms included.
+        subject_id = form["subject_id"]
+        saved = {}
+        for entry in saved_entries:
+            if str(entry["subject_id"]) == subject_id and entry["is_extra"] == 0:
+                saved.setdefault(str(entry["weekday"]), []).append(entry)
+        subjects[subject_id] = [
+            slot
+            for day in form.getlist("weekdays")
+            for slot in saved.get(day.strip(), [{"weekday": day}])
+        ]
+    return subjects
+
+
+def save_weekly_timetable(db, user_id, schedule):
+    # Diff the requested week against the saved recurring rows and touch only what
+    # changed: one executemany of deletes and one of inserts in a single transaction.
+    # Callers commit. Returns (inserted, deleted).
+    begin_write(db)
+    subject_ids = sorted(schedule)
+    cur = db.execute(
+        f"""
+        SELECT id, subject_id, weekday, start_time, end_time, room
+        FROM timetable
+        WHERE user_id = ? AND is_extra = 0 AND subject_id IN ({sql_placeholders(subject_ids)})
+        """,
+        (user_id, *subject_ids),
+    )
+    saved = {}
+    for row_id, subject_id, *slot in cur.fetchall():
+        saved.setdefault((subject_id, *slot), []).append(row_id)
+
+    inserts = []
+    for subject_id, slots in schedule.items():
+        for slot in slots:
+            row_ids = saved.get((subject_id, *slot))
+            if row_ids:
+                row_ids.pop()
+            else:
+                inserts.append((subject_id, user_id, *slot))
+    deletes = [(row_id,) for row_ids in saved.values() for row_id in row_ids]
+
+    db.executemany("DELETE FROM timetable WHERE id = ?", deletes)
+    db.executemany(
+        """
+        INSERT INTO timetable (subject_id, user_id, weekday, start_time, end_time, room, is_extra)
+        VALUES (?, ?, ?, ?, ?, ?, 0)
+        """,
+        inserts,
+    )
+    if inserts or deletes:
+        bump_data_version(db, user_id)
+    return len(inserts), len(deletes)
+
+
+def apply_weekly_timetable(subjects):
+    # Returns ((inserted, deleted), error_response), mirroring apply_attendance_marks.
+    schedule, error = parse_weekly_timetable(subjects)
+    if error:
+        return None, (jsonify({"error": error}), 400)
+
+    user_id = session["user_id"]
+    db = get_db()
+    foreign = sorted(set(schedule) - get_owned_subject_ids(db, user_id, schedule))
+    if foreign:
+        return None, (jsonify({"error": "Unknown subject", "subject_ids": foreign}), 403)
+
+    changes = save_weekly_timetable(db, user_id, schedule)
     db.commit()
-    db.close()
-    return redirect("/subjects")
+    return changes, None
 
 
 @app.route("/timetable", methods=["GET", "POST"])
@@ -1119,48 +3040,62 @@ def timetable():
     if not require_login():
         return redirect("/login")
 
-    user_id = session["user_id"]
-    db = get_db()
-    cur = db.cursor()
-
     if request.method == "POST":
-        subject_id = request.form["subject_id"]
-        weekdays = request.form.getlist("weekdays")
-        cur.execute(
-            "DELETE FROM timetable WHERE subject_id = ? AND user_id = ? AND is_extra = 0",
-            (subject_id, user_id),
-        )
-        for day in weekdays:
-            cur.execute(
-                "INSERT INTO timetable (subject_id, weekday, user_id, is_extra) VALUES (?, ?, ?, 0)",
-                (subject_id, int(day), user_id),
-            )
-        db.commit()
-        db.close()
+        subjects = parse_timetable_form(request.form, get_user_context().timetable)
+        if subjects:
+            _, error = apply_weekly_timetable(subjects)
+            if error:
+                return error
         return redirect("/timetable")
 
-    cur.execute("SELECT id, name FROM subjects WHERE user_id = ?", (user_id,))
-    subjects = cur.fetchall()
+    context = get_user_context()
+    subjects = [(subject["id"], subject["name"]) for subject in context.subjects]
 
-    cur.execute("SELECT subject_id, weekday FROM timetable WHERE user_id = ? AND is_extra = 0", (user_id,))
     timetable_map = {}
-    for subject_id, weekday in cur.fetchall():
-        timetable_map.setdefault(subject_id, []).append(weekday)
+    for entry in context.timetable:
+        if entry["is_extra"] == 0:
+            timetable_map.setdefault(entry["subject_id"], []).append(entry)
+    for entries in timetable_map.values():
+        entries.sort(key=lambda entry: (entry["weekday"], entry["start_time"] or "", entry["id"]))
 
-    db.close()
-    return render_template("timetable.html", subjects=subjects, timetable_map=timetable_map)
+    editor_rows = {subject_id: timetable_editor_rows(timetable_map.get(subject_id, [])) for subject_id, _ in subjects}
+
+    return render_template(
+        "timetable.html",
+        subjects=subjects,
+        timetable_map=timetable_map,
+        editor_rows=editor_rows,
+        weekday_names=WEEKDAY_NAMES,
+    )
+
+
+@app.route("/timetable/week", methods=["POST"])
+def save_timetable_week():
+    # JSON body: {"subjects": {"<subject_id>": [{"weekday": 0, "start_time": "09:00",
+    # "end_time": "10:00", "room": "B12"}, ...]}}. Each listed subject's recurring
+    # classes become exactly that list; subjects left out are not touched.
+    if not require_login():
+        return "", 401
+
+    payload = request.get_json(silent=True)
+    subjects = payload.get("subjects") if isinstance(payload, dict) else None
+    changes, error = apply_weekly_timetable(subjects)
+    if error:
+        return error
+    inserted, deleted = changes
+    return jsonify({"inserted": inserted, "deleted": deleted})
 
 
 @app.route("/study-planner")
+@conditional_page
 def study_planner():
     if not require_login():
         return redirect("/login")
 
-    user_id = session["user_id"]
     db = get_db()
-    plan = build_study_plan(user_id, db)
-    exam_countdown = get_exam_countdown(user_id, db, limit=4)
-    db.close()
+    context = get_user_context()
+    plan = get_study_plan(context, db)
+    exam_countdown = get_exam_countdown(context, db, limit=4)
 
     return render_template(
         "study_planner.html",
@@ -1191,8 +3126,8 @@ def toggle_study_planner_item():
         """,
         (user_id, session_key, completed, datetime.now().isoformat(timespec="seconds")),
     )
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
     return redirect("/study-planner")
 
 
@@ -1204,12 +3139,13 @@ def reset_study_planner_progress():
     db = get_db()
     cur = db.cursor()
     cur.execute("DELETE FROM study_plan_progress WHERE user_id = ?", (session["user_id"],))
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
     return redirect("/study-planner")
 
 
 @app.route("/profile", methods=["GET", "POST"])
+@conditional_page
 def profile():
     if not require_login():
         return redirect("/login")
@@ -1225,54 +3161,29 @@ def profile():
             "UPDATE users SET name = ?, email = ? WHERE id = ?",
             (new_name, new_email, user_id),
         )
+        bump_data_version(db, session["user_id"])
         db.commit()
 
     cur.execute("SELECT name, email, created_at FROM users WHERE id = ?", (user_id,))
     user = cur.fetchone()
 
-    cur.execute("SELECT COUNT(*) FROM subjects WHERE user_id = ?", (user_id,))
-    total_subjects = cur.fetchone()[0]
+    subject_ids = get_user_context().subject_ids
+    total_subjects = len(subject_ids)
 
     cur.execute(
-        """
-        SELECT COUNT(*) FROM deadlines
-        WHERE subject_id IN (
-            SELECT id FROM subjects WHERE user_id = ?
-        )
-        """,
-        (user_id,),
+        f"SELECT COUNT(*) FROM deadlines WHERE subject_id IN ({sql_placeholders(subject_ids)})",
+        subject_ids,
     )
     total_deadlines = cur.fetchone()[0]
 
     cur.execute(
-        """
-        SELECT COUNT(*) FROM attendance
-        WHERE subject_id IN (
-            SELECT id FROM subjects WHERE user_id = ?
-        )
-        AND status != 'cancelled'
-        """,
+        "SELECT COALESCE(SUM(total - cancelled), 0) FROM user_attendance_monthly WHERE user_id = ?",
         (user_id,),
     )
     total_attendance = cur.fetchone()[0]
 
-    cur.execute(
-        """
-        SELECT date,
-               SUM(CASE WHEN status = 'present' THEN 1 ELSE 0 END) * 100.0 / COUNT(*)
-        FROM attendance
-        WHERE status != 'cancelled'
-          AND subject_id IN (
-              SELECT id FROM subjects WHERE user_id = ?
-          )
-        GROUP BY date
-        ORDER BY date
-        """,
-        (user_id,),
-    )
-    attendance_trend = [round(row[1]) for row in cur.fetchall() if row[1] is not None]
-
-    db.close()
+    trend_bucket = choose_trend_bucket(db, user_id)
+    attendance_trend = [point["percentage"] for point in get_attendance_trend(db, user_id, trend_bucket)]
 
     return render_template(
         "profile.html",
@@ -1281,23 +3192,226 @@ def profile():
         total_deadlines=total_deadlines,
         total_attendance=total_attendance,
         attendance_trend=attendance_trend,
+        trend_bucket=trend_bucket,
+    )
+
+
+CLICK_LOG_BATCH_SIZE = int(os.getenv("CLICK_LOG_BATCH_SIZE", "200"))
+CLICK_LOG_FLUSH_SECONDS = float(os.getenv("CLICK_LOG_FLUSH_SECONDS", "5"))
+CLICK_LOG_RETENTION_DAYS = int(os.getenv("CLICK_LOG_RETENTION_DAYS", "30"))
+CLICK_LOG_MAX_BUFFER = CLICK_LOG_BATCH_SIZE * 20
+
+
+def write_click_events(db, events):
+    # events are (user_id, page, timestamp) with timestamps in click_log's UTC "YYYY-MM-DD HH:MM:SS" form.
+    # Clicks buffered just before an account was purged would now fail the users foreign key.
+    user_ids = list({event[0] for event in events if event[0] is not None})
+    known = {
+        row[0] for row in db.execute(f"SELECT id FROM users WHERE id IN ({sql_placeholders(user_ids)})", user_ids)
+    }
+    events = [event for event in events if event[0] is None or event[0] in known]
+    db.executemany("INSERT INTO click_log (user_id, page, timestamp) VALUES (?, ?, ?)", events)
+
+    page_counts = {}
+    user_counts = {}
+    for user_id, page, timestamp in events:
+        hour = timestamp[:13] + ":00"
+        page_counts[(hour, page)] = page_counts.get((hour, page), 0) + 1
+        user_counts[(hour, user_id)] = user_counts.get((hour, user_id), 0) + 1
+
+    db.executemany(
+        """
+        INSERT INTO click_page_hourly (hour, page, clicks) VALUES (?, ?, ?)
+        ON CONFLICT(hour, page) DO UPDATE SET clicks = clicks + excluded.clicks
+        """,
+        [(hour, page, clicks) for (hour, page), clicks in page_counts.items()],
+    )
+    db.executemany(
+        """
+        INSERT INTO click_user_hourly (hour, user_id, clicks) VALUES (?, ?, ?)
+        ON CONFLICT(hour, user_id) DO UPDATE SET clicks = clicks + excluded.clicks
+        """,
+        [(hour, user_id, clicks) for (hour, user_id), clicks in user_counts.items()],
     )
 
 
+def prune_click_log(db, retention_days):
+    # Rollups are kept; only raw rows past the window go.
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    cur = db.execute("DELETE FROM click_log WHERE timestamp < ?", (cutoff,))
+    return cur.rowcount
+
+
+class ClickLogBuffer:
+    """Collects navigation clicks in memory and writes them to SQLite in batches.
+
+    A background thread flushes every ``interval`` seconds, a full batch is
+    flushed straight away, and whatever is left is written at interpreter exit.
+    Raw rows older than the retention window are pruned at most once an hour.
+    """
+
+    def __init__(self, batch_size, interval, retention_days, max_buffer):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention_days = retention_days
+        self.max_buffer = max_buffer
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+        self._last_prune = None
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.flush_errors = 0
+
+    def add(self, user_id, page):
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._events.append((user_id, page, timestamp))
+            self.recorded += 1
+            if len(self._events) > self.max_buffer:
+                # The database has been unreachable for a while; keep the newest clicks.
+                overflow = len(self._events) - self.max_buffer
+                del self._events[:overflow]
+                self.dropped += overflow
+            full = len(self._events) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def discard_user(self, user_id):
+        with self._lock:
+            self._events = [event for event in self._events if event[0] != user_id]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events and not self._prune_due():
+                return 0
+
+            try:
+                db = db_pool.acquire()
+            except sqlite3.Error:
+                self._requeue(events)
+                return 0
+            try:
+                begin_write(db)
+                if events:
+                    write_click_events(db, events)
+                if self._prune_due():
+                    pruned = prune_click_log(db, self.retention_days)
+                    self._last_prune = time.monotonic()
+                else:
+                    pruned = 0
+                db.commit()
+            except sqlite3.Error as exc:
+                print(f"Click log flush failed: {exc}")
+                db.rollback()
+                self._requeue(events)
+                with self._lock:
+                    self.flush_errors += 1
+                return 0
+            finally:
+                db_pool.release(db)
+
+            with self._lock:
+                self.flushed += len(events)
+                self.pruned += pruned
+            return len(events)
+
+    def _prune_due(self):
+        return self._last_prune is None or time.monotonic() - self._last_prune >= 3600
+
+    def _requeue(self, events):
+        with self._lock:
+            self._events[:0] = events
+
+    def _ensure_thread(self):
+        # Started lazily and per process, because threads do not survive a gunicorn fork.
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="click-log-flusher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._events),
+                "recorded": self.recorded,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "pruned": self.pruned,
+                "flush_errors": self.flush_errors,
+            }
+
+
+click_buffer = ClickLogBuffer(
+    CLICK_LOG_BATCH_SIZE, CLICK_LOG_FLUSH_SECONDS, CLICK_LOG_RETENTION_DAYS, CLICK_LOG_MAX_BUFFER
+)
+atexit.register(click_buffer.flush)
+
+
+def collect_click_metrics():
+    stats = click_buffer.stats()
+    for outcome in ("recorded", "flushed", "dropped", "pruned"):
+        yield "counter", "college_click_events_total", (("outcome", outcome),), stats[outcome]
+    yield "counter", "college_click_flush_errors_total", (), stats["flush_errors"]
+    yield "gauge", "college_click_events_buffered", (), stats["buffered"]
+
+
+metrics.add_collector(collect_click_metrics)
+
+
 @app.route("/log-click/<page>")
 def log_click(page):
     if not require_login():
         return "", 401
 
-    user_id = session["user_id"]
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("INSERT INTO click_log (user_id, page) VALUES (?, ?)", (user_id, page))
-    db.commit()
-    db.close()
+    click_buffer.add(session["user_id"], page)
     return "", 204
 
 
+@app.route("/db-pool-stats")
+def db_pool_stats():
+    if not require_admin():
+        return "", 403
+    return jsonify(db_pool.stats())
+
+
+@app.route("/cache-stats")
+def cache_stats():
+    if not require_admin():
+        return "", 403
+    return jsonify({"study_plans": plan_cache.stats(), "click_log": click_buffer.stats()})
+
+
+@app.route("/metrics")
+def metrics_view():
+    if not require_admin():
+        return "", 403
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@app.route("/sql-stats")
+def sql_stats_view():
+    if not require_admin():
+        return "", 403
+    return jsonify(sql_stats.stats())
+
+
 @app.route("/register", methods=["GET", "POST"])
 def register():
     db = get_db()
@@ -1310,11 +3424,9 @@ def register():
         confirm = request.form.get("confirm")
 
         if not name or not password or not confirm:
-            db.close()
             return "Missing form data"
 
         if password != confirm:
-            db.close()
             return "Passwords do not match"
 
         hashed_password = generate_password_hash(password)
@@ -1323,7 +3435,6 @@ def register():
         cur.execute("SELECT id FROM users WHERE name = ?", (name,))
         existing = cur.fetchone()
         if existing:
-            db.close()
             return "User already exists"
 
         cur.execute(
@@ -1331,10 +3442,8 @@ def register():
             (name, email, hashed_password, created_at),
         )
         db.commit()
-        db.close()
         return redirect("/login")
 
-    db.close()
     return render_template("register.html")
 
 
@@ -1358,8 +3467,8 @@ def add_extra_class():
         (subject_id, -1, user_id, class_date),
     )
 
+    bump_data_version(db, session["user_id"])
     db.commit()
-    db.close()
 
     return redirect("/attendance")
 
@@ -1378,13 +3487,10 @@ def login():
 
         if user and check_password_hash(user[1], password):
             session["user_id"] = user[0]
-            db.close()
             return redirect("/dashboard")
 
-        db.close()
         return "Invalid username or password"
 
-    db.close()
     return render_template("login.html")
 
 
@@ -1402,48 +3508,183 @@ def forgot_password():
         cur = db.cursor()
         cur.execute("UPDATE users SET password = ? WHERE name = ?", (hashed_password, username))
         db.commit()
-        db.close()
         return redirect("/login")
 
     return render_template("forgot_password.html")
 
 
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.05"))
+
+# Children before parents, so the cascades behind the last two deletes have almost nothing left to do.
+OWNED_SUBJECTS = "subject_id IN (SELECT id FROM subjects WHERE user_id = :user_id)"
+PURGE_STEPS = [
+    ("attendance", OWNED_SUBJECTS),
+    ("subject_attendance_stats", OWNED_SUBJECTS),
+    ("deadlines", OWNED_SUBJECTS),
+    ("timetable", f"{OWNED_SUBJECTS} OR user_id = :user_id"),
+    ("user_attendance_daily", "user_id = :user_id"),
+    ("user_attendance_monthly", "user_id = :user_id"),
+    ("click_log", "user_id = :user_id"),
+    ("click_user_hourly", "user_id = :user_id"),
+    ("study_plan_progress", "user_id = :user_id"),
+    ("report_deliveries", "user_id = :user_id"),
+    ("settings", "user_id = :user_id"),
+    ("subjects", "user_id = :user_id"),
+    ("users", "id = :user_id"),
+]
+
+
+def request_account_purge(db, user_id):
+    # The account is gone for its owner at once: the name is freed, the email
+    # dropped and no password matches. Its rows are deleted later by the purge job.
+    begin_write(db)
+    db.execute(
+        "INSERT OR IGNORE INTO account_purges (user_id, status, requested_at) VALUES (?, 'pending', ?)",
+        (user_id, datetime.now().isoformat(timespec="seconds")),
+    )
+    db.execute(
+        "UPDATE users SET name = ?, email = NULL, password = '' WHERE id = ?",
+        (f"deleted:{user_id}:{secrets.token_hex(8)}", user_id),
+    )
+    bump_data_version(db, user_id)
+    db.commit()
+
+
+def purge_account_chunk(db, table, condition, user_id, chunk_size):
+    # Each chunk is its own short write transaction, so other writers get the lock in between.
+    begin_write(db)
+    cur = db.execute(
+        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT :limit)",
+        {"user_id": user_id, "limit": chunk_size},
+    )
+    deleted = cur.rowcount
+    db.execute("UPDATE account_purges SET rows_deleted = rows_deleted + ? WHERE user_id = ?", (deleted, user_id))
+    db.commit()
+    return deleted
+
+
+def purge_account(db, user_id, chunk_size=PURGE_CHUNK_SIZE, pause=PURGE_PAUSE_SECONDS):
+    db.execute("UPDATE account_purges SET status = 'running', last_error = NULL WHERE user_id = ?", (user_id,))
+    db.commit()
+    for table, condition in PURGE_STEPS:
+        while purge_account_chunk(db, table, condition, user_id, chunk_size) == chunk_size:
+            time.sleep(pause)
+    db.execute(
+        "UPDATE account_purges SET status = 'done', finished_at = ? WHERE user_id = ?",
+        (datetime.now().isoformat(timespec="seconds"), user_id),
+    )
+    db.commit()
+
+
+def run_account_purges(retry_failed=False):
+    # A purge that stopped halfway is simply run again; every step is an idempotent delete.
+    db = connect_db()
+    statuses = ("pending", "running", "failed") if retry_failed else ("pending", "running")
+    attempted = set()
+    try:
+        while True:
+            cur = db.execute(
+                f"""
+                SELECT user_id FROM account_purges
+                WHERE status IN ({sql_placeholders(statuses)})
+                ORDER BY requested_at, user_id
+                """,
+                statuses,
+            )
+            pending = [row[0] for row in cur.fetchall() if row[0] not in attempted]
+            if not pending:
+                return
+            user_id = pending[0]
+            attempted.add(user_id)
+            try:
+                purge_account(db, user_id)
+            except sqlite3.Error as exc:
+                print(f"Account purge for user {user_id} stopped: {exc}")
+                if db.in_transaction:
+                    db.rollback()
+                db.execute(
+                    "UPDATE account_purges SET status = 'failed', last_error = ? WHERE user_id = ?",
+                    (str(exc), user_id),
+                )
+                db.commit()
+    finally:
+        db.close()
+
+
+purge_worker_state = {"running": False, "requested": False, "pid": None}
+purge_worker_lock = threading.Lock()
+
+
+def start_account_purge_worker():
+    # One purge thread per process; a request that arrives while it runs is picked up before it exits.
+    with purge_worker_lock:
+        purge_worker_state["requested"] = True
+        if purge_worker_state["running"]:
+            return False
+        purge_worker_state["running"] = True
+
+    def work():
+        while True:
+            with purge_worker_lock:
+                if not purge_worker_state["requested"]:
+                    purge_worker_state["running"] = False
+                    return
+                purge_worker_state["requested"] = False
+            try:
+                run_account_purges()
+            except Exception as exc:
+                print(f"Account purge worker stopped: {exc}")
+
+    threading.Thread(target=work, name="account-purge", daemon=True).start()
+    return True
+
+
+@app.before_request
+def resume_account_purges():
+    # The first request of each process picks up purges a restart left pending or running.
+    with purge_worker_lock:
+        if purge_worker_state["pid"] == os.getpid():
+            return
+        # A forked gunicorn worker inherits these flags but not the thread behind them.
+        purge_worker_state.update(pid=os.getpid(), running=False)
+    start_account_purge_worker()
+
+
+def find_orphan_rows(db):
+    # Every relation is a declared foreign key, so SQLite can list the rows whose parent is gone.
+    counts = {}
+    for table, _, parent, _ in db.execute("PRAGMA foreign_key_check").fetchall():
+        counts[(table, parent)] = counts.get((table, parent), 0) + 1
+    return counts
+
+
+def delete_orphan_rows(db, chunk_size=PURGE_CHUNK_SIZE):
+    deleted = 0
+    while True:
+        by_table = {}
+        for table, rowid, _, _ in db.execute("PRAGMA foreign_key_check").fetchall():
+            by_table.setdefault(table, []).append(rowid)
+        if not by_table:
+            return deleted
+        for table, rowids in by_table.items():
+            for start in range(0, len(rowids), chunk_size):
+                chunk = rowids[start:start + chunk_size]
+                begin_write(db)
+                cur = db.execute(f"DELETE FROM {table} WHERE rowid IN ({sql_placeholders(chunk)})", chunk)
+                deleted += cur.rowcount
+                db.commit()
+
+
 @app.route("/delete-account", methods=["POST"])
 def delete_account():
     if not require_login():
         return redirect("/login")
 
     user_id = session["user_id"]
-    db = get_db()
-    cur = db.cursor()
-
-    cur.execute(
-        """
-        DELETE FROM attendance
-        WHERE subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
-        """,
-        (user_id,),
-    )
-    cur.execute(
-        """
-        DELETE FROM deadlines
-        WHERE subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
-        """,
-        (user_id,),
-    )
-    cur.execute(
-        """
-        DELETE FROM timetable
-        WHERE subject_id IN (SELECT id FROM subjects WHERE user_id = ?)
-        """,
-        (user_id,),
-    )
-    cur.execute("DELETE FROM subjects WHERE user_id = ?", (user_id,))
-    cur.execute("DELETE FROM settings WHERE user_id = ?", (user_id,))
-    cur.execute("DELETE FROM click_log WHERE user_id = ?", (user_id,))
-    cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    db.commit()
-    db.close()
+    request_account_purge(get_db(), user_id)
+    click_buffer.discard_user(user_id)
+    start_account_purge_worker()
     session.clear()
     return redirect("/register")
 
@@ -1484,15 +3725,7 @@ def ensure_database_ready():
         return f"Primary database is unreadable. Using fallback database at: {DB_PATH}"
 
 
-def init_db():
-    backup_path = ensure_database_ready()
-    if backup_path:
-        print(f"Database recovery: {backup_path}")
-
-    db = get_db()
-    with open("schema.sql", "r", encoding="utf-8") as schema_file:
-        db.executescript(schema_file.read())
-
+def migrate_legacy_schema(db):
     # These guards let the app open both fresh databases and older local copies without manual SQL fixes.
     ensure_column(db, "subjects", "attendance_weight", "INTEGER DEFAULT 1")
     ensure_column(db, "timetable", "user_id", "INTEGER")
@@ -1534,8 +3767,354 @@ def init_db():
         """
     )
 
-    db.commit()
+
+def migrate_hot_query_indexes(db):
+    # Older databases can hold several rows for one subject/date pair; keep the
+    # most recent mark so the unique index below can be created.
+    db.execute(
+        """
+        DELETE FROM attendance
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM attendance GROUP BY subject_id, date
+        )
+        """
+    )
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_subject_date ON attendance (subject_id, date)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_subjects_user ON subjects (user_id)")
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_deadlines_subject_open ON deadlines (subject_id, completed, due_date)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_timetable_user_weekday ON timetable (user_id, weekday)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_timetable_user_class_date ON timetable (user_id, class_date)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_timetable_subject_weekday ON timetable (subject_id, weekday)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_click_log_user ON click_log (user_id)")
+
+
+def migrate_attendance_stats(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subject_attendance_stats (
+            subject_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            last_date TEXT,
+            FOREIGN KEY (subject_id) REFERENCES subjects(id)
+        )
+        """
+    )
+    rebuild_attendance_stats(db, tables={"subject_attendance_stats"})
+
+
+def migrate_report_jobs(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week_key TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            lease_until TEXT,
+            last_error TEXT
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_deliveries (
+            job_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (job_id, user_id),
+            FOREIGN KEY (job_id) REFERENCES report_jobs(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_report_deliveries_status ON report_deliveries (job_id, status)")
+
+
+def migrate_user_data_version(db):
+    ensure_column(db, "users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def migrate_click_rollups(db):
+    db.execute("CREATE INDEX IF NOT EXISTS idx_click_log_timestamp ON click_log (timestamp)")
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS click_page_hourly (
+            hour TEXT NOT NULL,
+            page TEXT NOT NULL,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, page)
+        )
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS click_user_hourly (
+            hour TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_click_user_hourly_user ON click_user_hourly (user_id)")
+    # Existing raw history is folded in so the rollups cover the whole log, not just new clicks.
+    db.execute(
+        """
+        INSERT INTO click_page_hourly (hour, page, clicks)
+        SELECT substr(timestamp, 1, 13) || ':00', page, COUNT(*)
+        FROM click_log
+        WHERE timestamp IS NOT NULL AND page IS NOT NULL
+        GROUP BY 1, 2
+        """
+    )
+    db.execute(
+        """
+        INSERT INTO click_user_hourly (hour, user_id, clicks)
+        SELECT substr(timestamp, 1, 13) || ':00', user_id, COUNT(*)
+        FROM click_log
+        WHERE timestamp IS NOT NULL AND user_id IS NOT NULL
+        GROUP BY 1, 2
+        """
+    )
+
+
+def migrate_monthly_attendance(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_attendance_monthly (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+    )
+    rebuild_attendance_stats(db, tables={"user_attendance_monthly"})
+
+
+def migrate_daily_attendance(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_attendance_daily (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+    )
+    rebuild_attendance_stats(db, tables={"user_attendance_daily"})
+
+
+def migrate_cascading_foreign_keys(db):
+    # SQLite cannot change a constraint in place, so every table with a foreign key is
+    # rebuilt with ON DELETE CASCADE added, keeping its rows, indexes and id sequence.
+    # run_migrations turns enforcement off first, so dropping the old tables cascades nothing.
+    cur = db.cursor()
+    cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE '%REFERENCES%'")
+    for table, create_sql in cur.fetchall():
+        if "ON DELETE" in create_sql.upper():
+            continue
+        rebuilt_sql = re.sub(r"(REFERENCES\s+\w+\s*\(\s*\w+\s*\))", r"\1 ON DELETE CASCADE", create_sql, flags=re.I)
+        rebuilt_sql = re.sub(rf"^\s*CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE {table}_rebuilt", rebuilt_sql, flags=re.I)
+        cur.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+        index_sql = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        sequence = cur.fetchone()
+        columns = ", ".join(row[1] for row in db.execute(f"PRAGMA table_info({table})").fetchall())
+
+        db.execute(rebuilt_sql)
+        db.execute(f"INSERT INTO {table}_rebuilt ({columns}) SELECT {columns} FROM {table}")
+        db.execute(f"DROP TABLE {table}")
+        db.execute(f"ALTER TABLE {table}_rebuilt RENAME TO {table}")
+        for sql in index_sql:
+            db.execute(sql)
+        if sequence:
+            db.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+
+    # Deleting a user cascades into report_deliveries, whose primary key starts with job_id.
+    db.execute("CREATE INDEX IF NOT EXISTS idx_report_deliveries_user ON report_deliveries (user_id)")
+    orphans = sum(find_orphan_rows(db).values())
+    if orphans:
+        print(f"{orphans} orphaned row(s) from earlier deletes; see flask --app app orphan-report")
+
+
+def migrate_account_purges(db):
+    # No foreign key to users: the row outlives the account it describes.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS account_purges (
+            user_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            requested_at TEXT,
+            finished_at TEXT,
+            rows_deleted INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+        """
+    )
+
+
+def migrate_deadline_due_index(db):
+    # Lets the unfiltered and archive deadline pages seek to their keyset cursor per subject.
+    db.execute("CREATE INDEX IF NOT EXISTS idx_deadlines_subject_due ON deadlines (subject_id, due_date)")
+
+
+# Each entry runs once, in order, and PRAGMA user_version records the last one applied.
+# Append new migrations to the end; never renumber or edit one that has shipped.
+MIGRATIONS = [
+    (1, "legacy column and table patches", migrate_legacy_schema),
+    (2, "indexes for hot attendance, deadline and timetable queries", migrate_hot_query_indexes),
+    (3, "per-subject attendance counters", migrate_attendance_stats),
+    (4, "weekly report jobs and delivery state", migrate_report_jobs),
+    (5, "per-user data version for cache invalidation", migrate_user_data_version),
+    (6, "hourly click rollups and click_log retention index", migrate_click_rollups),
+    (7, "per-user monthly attendance rollup", migrate_monthly_attendance),
+    (8, "per-user daily attendance rollup", migrate_daily_attendance),
+    (9, "ON DELETE CASCADE foreign keys", migrate_cascading_foreign_keys),
+    (10, "background account purge queue", migrate_account_purges),
+    (11, "deadline due-date index", migrate_deadline_due_index),
+]
+
+
+def get_schema_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(db):
+    current_version = get_schema_version(db)
+    # Table rebuilds drop and recreate parents; with enforcement on that would cascade.
+    # The pragma is ignored inside a transaction, so it is switched outside of them.
+    db.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for version, description, migrate in MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            db.execute("BEGIN")
+            try:
+                migrate(db)
+                # PRAGMA does not accept bound parameters; version is always an int from MIGRATIONS.
+                db.execute(f"PRAGMA user_version = {int(version)}")
+                db.commit()
+            except sqlite3.Error:
+                db.rollback()
+                raise
+            print(f"Applied migration {version}: {description}")
+    finally:
+        db.execute("PRAGMA foreign_keys=ON")
+
+
+def init_db():
+    backup_path = ensure_database_ready()
+    if backup_path:
+        print(f"Database recovery: {backup_path}")
+
+    db = connect_db()
+    with open("schema.sql", "r", encoding="utf-8") as schema_file:
+        db.executescript(schema_file.read())
+
+    run_migrations(db)
+    db.close()
+
+
+@app.cli.command("verify-attendance-stats")
+@click.option("--rebuild", is_flag=True, help="Recompute the rollups from raw attendance rows.")
+def verify_attendance_stats_command(rebuild):
+    """Check the attendance rollup tables against the attendance table."""
+    db = connect_db()
+    if rebuild:
+        rebuild_attendance_stats(db)
+        db.commit()
+        click.echo("Rebuilt attendance rollups from raw rows.")
+
+    mismatches = verify_attendance_stats(db)
+    db.close()
+    for mismatch in mismatches:
+        click.echo(
+            f"{mismatch['table']} {mismatch['key']}: stored {mismatch['stored']} expected {mismatch['expected']}"
+        )
+    click.echo(f"{len(mismatches)} rollup row(s) out of sync.")
+    if mismatches:
+        raise SystemExit(1)
+
+
+@app.cli.command("send-weekly-reports")
+@click.option("--week", default=None, help="ISO week key such as 2026-W42; defaults to the current week.")
+def send_weekly_reports_command(week):
+    """Run the weekly report job in the foreground, resuming any unfinished run."""
+    db = connect_db()
+    job_id, status = enqueue_weekly_report(db, week or current_report_week())
+    if status != "done":
+        run_weekly_report_job(job_id)
+    progress = get_report_job_progress(db, job_id)
+    db.close()
+    click.echo(
+        f"Job {job_id} ({progress['week']}): {progress['status']}, "
+        f"{progress['sent']} sent, {progress['failed']} failed, {progress['pending']} pending"
+    )
+
+
+@app.cli.command("orphan-report")
+@click.option("--delete", is_flag=True, help="Delete the orphaned rows after listing them.")
+def orphan_report_command(delete):
+    """List rows whose parent subject or user no longer exists."""
+    db = connect_db()
+    orphans = find_orphan_rows(db)
+    for (table, parent), count in sorted(orphans.items()):
+        click.echo(f"{table}: {count} row(s) pointing at missing {parent}")
+    click.echo(f"{sum(orphans.values())} orphaned row(s).")
+    if delete and orphans:
+        click.echo(f"Deleted {delete_orphan_rows(db)} row(s).")
+    db.close()
+
+
+@app.cli.command("purge-accounts")
+@click.option("--retry-failed", is_flag=True, help="Also retry purges that stopped with an error.")
+def purge_accounts_command(retry_failed):
+    """Finish deleting the data of accounts removed through /delete-account."""
+    run_account_purges(retry_failed)
+    db = connect_db()
+    cur = db.execute("SELECT status, COUNT(*) FROM account_purges GROUP BY status ORDER BY status")
+    click.echo(", ".join(f"{count} {status}" for status, count in cur.fetchall()) or "No account purges.")
+    db.close()
+
+
+@app.cli.command("danger-report")
+@click.option("--low-attendance", default=DANGER_LOW_ATTENDANCE, show_default=True, help="Flag subjects at or below this attendance percentage.")
+@click.option("--urgent-days", default=DANGER_URGENT_DAYS, show_default=True, help="Flag open deadlines due within this many days.")
+@click.option("--overload", default=DANGER_OVERLOAD_ASSIGNMENTS, show_default=True, help="Flag subjects with more open assignments than this.")
+def danger_report_command(low_attendance, urgent_days, overload):
+    """List every user's subjects that the weekly danger page would flag."""
+    db = connect_db()
+    risks = classify_subject_risks(db, None, low_attendance, urgent_days, overload)
     db.close()
+    flagged = 0
+    for user_id, subjects in risks.items():
+        for risk in subjects:
+            if risk["reasons"]:
+                flagged += 1
+                click.echo(f"user {user_id}  {risk['subject']} ({risk['percentage']}%): {', '.join(risk['reasons'])}")
+    click.echo(f"{flagged} subject(s) flagged.")
 
 
 with app.app_context():
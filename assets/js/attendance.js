@@ -0,0 +1,206 @@
+// Calendar clicks are queued and sent together, so back-filling a week is one request instead of dozens.
+const pendingMarks = new Map();
+const statusLabels = { present: "P", absent: "A", cancelled: "C" };
+let flushTimer = null;
+
+function showPendingStatus(cell, status) {
+    cell.querySelectorAll(".status").forEach((badge) => badge.remove());
+    const badge = document.createElement("div");
+    badge.className = `status ${status}`;
+    badge.textContent = statusLabels[status];
+    cell.appendChild(badge);
+    cell.classList.add("pending");
+}
+
+function takePendingMarks() {
+    const marks = Array.from(pendingMarks.values());
+    pendingMarks.clear();
+    return marks;
+}
+
+function flushMarks() {
+    clearTimeout(flushTimer);
+    const marks = takePendingMarks();
+    if (!marks.length) return;
+
+    fetch("/mark-attendance/batch", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ marks })
+    }).then((response) => {
+        if (!response.ok) {
+            alert("Some attendance marks could not be saved.");
+        }
+        // Percentages are computed server-side, so refresh once the queue has drained.
+        if (!pendingMarks.size) location.reload();
+    });
+}
+
+// Delegated so cells re-rendered for another month stay clickable.
+document.getElementById("subjectsContainer").addEventListener("click", (event) => {
+    const cell = event.target.closest(".day-cell");
+    if (!cell) return;
+
+    const date = cell.dataset.date;
+    const subjectId = cell.dataset.subject;
+
+    const status = prompt(
+        "Mark attendance:\n1 = Present\n2 = Absent\n3 = Cancelled"
+    );
+
+    const map = { "1": "present", "2": "absent", "3": "cancelled" };
+    if (!map[status]) return;
+
+    pendingMarks.set(`${subjectId}|${date}`, {
+        subject_id: subjectId,
+        date: date,
+        status: map[status]
+    });
+    showPendingStatus(cell, map[status]);
+
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushMarks, 1500);
+});
+
+// Leaving the page should not drop clicks that are still waiting for the timer.
+window.addEventListener("pagehide", () => {
+    if (!pendingMarks.size) return;
+    const body = JSON.stringify({ marks: takePendingMarks() });
+    navigator.sendBeacon("/mark-attendance/batch", new Blob([body], { type: "application/json" }));
+});
+
+// Each card's calendar pages through months with one request for all cards,
+// so the page never carries more than the month being looked at.
+(() => {
+    const container = document.getElementById("subjectsContainer");
+    const grids = Array.from(container.querySelectorAll(".calendar-grid"));
+    if (!grids.length) return;
+
+    const subjectIds = grids.map((grid) => grid.dataset.subject);
+    const query = subjectIds.map((id) => `subject_id=${encodeURIComponent(id)}`).join("&");
+    const months = new Map();
+    let year = +container.dataset.year;
+    let month = +container.dataset.month;
+
+    function shift(y, m, step) {
+        const index = y * 12 + (m - 1) + step;
+        return [Math.floor(index / 12), (index % 12) + 1];
+    }
+
+    function loadMonth(y, m) {
+        const key = `${y}-${m}`;
+        if (!months.has(key)) {
+            const request = fetch(`/api/attendance/month?year=${y}&month=${m}&${query}`)
+                .then((response) => (response.ok ? response.json() : Promise.reject(response)))
+                .then((data) => data.subjects)
+                .catch((error) => {
+                    months.delete(key);
+                    throw error;
+                });
+            months.set(key, request);
+        }
+        return months.get(key);
+    }
+
+    function renderGrid(grid, y, m, statuses) {
+        const lead = (new Date(y, m - 1, 1).getDay() + 6) % 7;
+        const days = new Date(y, m, 0).getDate();
+        grid.innerHTML = "";
+        for (let i = 0; i < lead; i++) grid.appendChild(document.createElement("div"));
+
+        for (let day = 1; day <= days; day++) {
+            const key = `${y}-${String(m).padStart(2, "0")}-${String(day).padStart(2, "0")}`;
+            const cell = document.createElement("div");
+            cell.className = "day-cell";
+            cell.dataset.date = key;
+            cell.dataset.subject = grid.dataset.subject;
+            cell.innerHTML = `<div>${day}</div>`;
+
+            const pending = pendingMarks.get(`${grid.dataset.subject}|${key}`);
+            const status = pending ? pending.status : statuses[key];
+            if (status) {
+                const badge = document.createElement("div");
+                badge.className = `status ${status}`;
+                badge.textContent = statusLabels[status];
+                cell.appendChild(badge);
+                if (pending) cell.classList.add("pending");
+            }
+            grid.appendChild(cell);
+        }
+    }
+
+    container.addEventListener("click", (event) => {
+        const button = event.target.closest(".calendar-step");
+        if (!button) return;
+
+        const step = +button.dataset.step;
+        const [nextYear, nextMonth] = shift(year, month, step);
+        loadMonth(nextYear, nextMonth).then((subjects) => {
+            year = nextYear;
+            month = nextMonth;
+            const label = new Date(year, month - 1, 1).toLocaleString("default", { month: "long", year: "numeric" });
+            grids.forEach((grid) => renderGrid(grid, year, month, subjects[grid.dataset.subject] || {}));
+            container.querySelectorAll(".calendar-label").forEach((el) => (el.textContent = label));
+            // Warm the next step in the same direction so paging feels instant.
+            loadMonth(...shift(year, month, step)).catch(() => {});
+        });
+    });
+})();
+
+const selector = document.getElementById("subjectSelect");
+const container = document.getElementById("subjectsContainer");
+
+// This does not filter cards out; it simply bubbles the selected subject to the top.
+selector.addEventListener("change", () => {
+    const selected = selector.value;
+    const cards = Array.from(container.children);
+
+    cards.forEach((card) => {
+        card.style.opacity = "0";
+        card.style.transform = "translateY(12px)";
+    });
+
+    setTimeout(() => {
+        if (selected) {
+            cards.sort((a, b) =>
+                a.dataset.subject === selected ? -1 :
+                b.dataset.subject === selected ? 1 : 0
+            );
+        }
+
+        cards.forEach((card) => container.appendChild(card));
+
+        requestAnimationFrame(() => {
+            cards.forEach((card) => {
+                card.style.opacity = "1";
+                card.style.transform = "translateY(0)";
+            });
+        });
+    }, 250);
+});
+
+// The ring uses stroke offset instead of width so the circular progress animates smoothly.
+document.querySelectorAll(".ring-progress").forEach((circle) => {
+    const percent = circle.dataset.progress;
+    const radius = 50;
+    const circumference = 2 * Math.PI * radius;
+    const offset = circumference - (percent / 100) * circumference;
+    circle.style.strokeDashoffset = offset;
+});
+
+// Simple count-up animation to keep the summary card from feeling static on load.
+document.querySelectorAll(".count-up").forEach((el) => {
+    const target = +el.dataset.target;
+    let current = 0;
+    const step = Math.max(1, Math.ceil(target / 40));
+
+    const timer = setInterval(() => {
+        current += step;
+        if (current >= target) {
+            el.textContent = target;
+            clearInterval(timer);
+        } else {
+            el.textContent = current;
+        }
+    }, 18);
+});
@@ -0,0 +1,67 @@
+// Other months are fetched one at a time from the month API instead of shipping the whole history.
+(() => {
+    const page = document.querySelector(".calendar-page");
+    const body = document.getElementById("calendarBody");
+    const label = document.getElementById("calendarLabel");
+    const subjectId = page.dataset.subject;
+    const months = new Map();
+    let year = +page.dataset.year;
+    let month = +page.dataset.month;
+
+    function shift(y, m, step) {
+        const index = y * 12 + (m - 1) + step;
+        return [Math.floor(index / 12), (index % 12) + 1];
+    }
+
+    function loadMonth(y, m) {
+        const key = `${y}-${m}`;
+        if (!months.has(key)) {
+            const request = fetch(`/api/attendance/${subjectId}/month?year=${y}&month=${m}`)
+                .then((response) => (response.ok ? response.json() : Promise.reject(response)))
+                .then((data) => data.statuses)
+                .catch((error) => {
+                    months.delete(key);
+                    throw error;
+                });
+            months.set(key, request);
+        }
+        return months.get(key);
+    }
+
+    function render(y, m, statuses) {
+        const lead = (new Date(y, m - 1, 1).getDay() + 6) % 7;
+        const days = new Date(y, m, 0).getDate();
+        const cells = Array(lead).fill(0).concat(Array.from({ length: days }, (_, i) => i + 1));
+        while (cells.length % 7) cells.push(0);
+
+        body.innerHTML = "";
+        for (let start = 0; start < cells.length; start += 7) {
+            const row = document.createElement("tr");
+            cells.slice(start, start + 7).forEach((day) => {
+                const cell = document.createElement("td");
+                if (day) {
+                    const key = `${y}-${String(m).padStart(2, "0")}-${String(day).padStart(2, "0")}`;
+                    const status = statuses[key];
+                    if (status === "present" || status === "absent") cell.className = status;
+                    cell.textContent = day;
+                }
+                row.appendChild(cell);
+            });
+            body.appendChild(row);
+        }
+        label.textContent = `${m}/${y}`;
+    }
+
+    document.querySelectorAll(".calendar-step").forEach((button) => {
+        button.addEventListener("click", () => {
+            const [nextYear, nextMonth] = shift(year, month, +button.dataset.step);
+            loadMonth(nextYear, nextMonth).then((statuses) => {
+                year = nextYear;
+                month = nextMonth;
+                render(year, month, statuses);
+                // Warm the next step in the same direction so paging feels instant.
+                loadMonth(...shift(year, month, +button.dataset.step)).catch(() => {});
+            });
+        });
+    });
+})();
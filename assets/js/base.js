@@ -0,0 +1,28 @@
+const switcher = document.getElementById("themeSwitcher");
+
+function applyTheme(theme) {
+    document.body.className = theme;
+    localStorage.setItem("site-theme", theme);
+}
+
+if (switcher) {
+    switcher.addEventListener("change", function () {
+        applyTheme(this.value);
+    });
+}
+
+window.addEventListener("DOMContentLoaded", function () {
+    const savedTheme = localStorage.getItem("site-theme");
+    const validThemes = ["", "theme-matcha", "theme-terracotta"];
+    const themeToApply = validThemes.includes(savedTheme) ? savedTheme : "";
+
+    document.body.className = themeToApply;
+
+    if (savedTheme !== themeToApply) {
+        localStorage.setItem("site-theme", themeToApply);
+    }
+
+    if (switcher) {
+        switcher.value = themeToApply;
+    }
+});
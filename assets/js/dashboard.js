@@ -0,0 +1,43 @@
+function go(url, event) {
+    const card = event.currentTarget;
+    const circle = document.createElement("span");
+    const d = Math.max(card.clientWidth, card.clientHeight);
+    circle.style.width = circle.style.height = d + "px";
+    circle.style.left = event.clientX - card.offsetLeft - d/2 + "px";
+    circle.style.top = event.clientY - card.offsetTop - d/2 + "px";
+    circle.className = "ripple";
+    card.appendChild(circle);
+    setTimeout(() => location.href = url, 180);
+}
+
+document.querySelectorAll(".count").forEach(el => {
+    const target = parseInt(el.dataset.target) || 0;
+    let count = 0;
+    if (target === 0) {
+        el.textContent = 0;
+        return;
+    }
+    const interval = setInterval(() => {
+        count++;
+        el.textContent = count;
+        if (count >= target) clearInterval(interval);
+    }, 20);
+});
+
+const data = JSON.parse(document.getElementById("attendanceTrendData").textContent);
+if (data.length > 1) {
+    const c = document.getElementById("attendanceSparkline");
+    const ctx = c.getContext("2d");
+    const w = c.width, h = c.height, p = 8;
+    const max = Math.max(...data);
+    const min = Math.min(...data);
+    ctx.strokeStyle = getComputedStyle(document.body).getPropertyValue('--primary');
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    data.forEach((v,i)=>{
+        const x = p + i*(w-p*2)/(data.length-1);
+        const y = h - p - (v-min)*(h-p*2)/(max-min||1);
+        i ? ctx.lineTo(x,y) : ctx.moveTo(x,y);
+    });
+    ctx.stroke();
+}
@@ -0,0 +1,18 @@
+function togglePassword() {
+    const input = document.getElementById("password");
+    input.type = input.type === "password" ? "text" : "password";
+}
+const card = document.getElementById("card");
+document.addEventListener("mousemove", (e) => {
+    const x = (window.innerWidth / 2 - e.pageX) / 20;
+    const y = (window.innerHeight / 2 - e.pageY) / 20;
+    card.style.transform = `rotateY(${x}deg) rotateX(${y}deg)`;
+});
+document.addEventListener("mouseleave", () => {
+    card.style.transform = "rotateY(0deg) rotateX(0deg)";
+});
+window.addEventListener("DOMContentLoaded", () => {
+    const savedTheme = localStorage.getItem("site-theme");
+    const validThemes = ["", "theme-matcha", "theme-terracotta"];
+    document.body.className = validThemes.includes(savedTheme) ? savedTheme : "";
+});
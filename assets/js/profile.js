@@ -0,0 +1,67 @@
+const data = JSON.parse(document.getElementById("attendanceTrendData").textContent);
+if (data.length > 1) {
+    const c = document.getElementById("profileChart");
+    const ctx = c.getContext("2d");
+    const styles = getComputedStyle(document.body);
+    const primary = styles.getPropertyValue("--primary").trim();
+    const accent = styles.getPropertyValue("--accent").trim();
+    const muted = styles.getPropertyValue("--text-muted").trim();
+    const w = c.width;
+    const h = c.height;
+    const padding = { top: 24, right: 24, bottom: 34, left: 24 };
+    const chartW = w - padding.left - padding.right;
+    const chartH = h - padding.top - padding.bottom;
+    const max = Math.max(...data, 100);
+    const min = Math.min(...data, 0);
+
+    ctx.clearRect(0, 0, w, h);
+    ctx.lineWidth = 1;
+    ctx.strokeStyle = primary + "22";
+    ctx.fillStyle = muted;
+    ctx.font = "12px Segoe UI";
+
+    [0, 25, 50, 75, 100].forEach((tick) => {
+        const y = padding.top + chartH - ((tick - min) / (max - min || 1)) * chartH;
+        ctx.beginPath();
+        ctx.moveTo(padding.left, y);
+        ctx.lineTo(w - padding.right, y);
+        ctx.stroke();
+        ctx.fillText(`${tick}%`, padding.left, y - 6);
+    });
+
+    const points = data.map((value, index) => {
+        const x = padding.left + (index * chartW / (data.length - 1));
+        const y = padding.top + chartH - ((value - min) / (max - min || 1)) * chartH;
+        return { x, y, value };
+    });
+
+    const area = new Path2D();
+    area.moveTo(points[0].x, h - padding.bottom);
+    points.forEach((point) => area.lineTo(point.x, point.y));
+    area.lineTo(points[points.length - 1].x, h - padding.bottom);
+    area.closePath();
+
+    const gradient = ctx.createLinearGradient(0, padding.top, 0, h - padding.bottom);
+    gradient.addColorStop(0, primary + "47");
+    gradient.addColorStop(1, accent + "12");
+    ctx.fillStyle = gradient;
+    ctx.fill(area);
+
+    ctx.strokeStyle = primary;
+    ctx.lineWidth = 3;
+    ctx.beginPath();
+    points.forEach((point, index) => {
+        index ? ctx.lineTo(point.x, point.y) : ctx.moveTo(point.x, point.y);
+    });
+    ctx.stroke();
+
+    points.forEach((point) => {
+        ctx.fillStyle = accent;
+        ctx.beginPath();
+        ctx.arc(point.x, point.y, 4, 0, Math.PI * 2);
+        ctx.fill();
+        ctx.strokeStyle = primary;
+        ctx.lineWidth = 2;
+        ctx.stroke();
+    });
+}
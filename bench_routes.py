@@ -0,0 +1,193 @@
+"""Benchmark the main routes through the Flask test client against a stored baseline.
+
+A fresh temporary database is seeded with seed_data.py, then every route is
+requested in turn by a few logged-in clients while the SQL statements each
+request runs are counted. Results are compared with the baseline file, and a
+route whose median got slower or that runs more statements is reported as a
+regression.
+
+    python bench_routes.py                    # compare with bench_baseline.json
+    python bench_routes.py --save-baseline    # record a new baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "bench_baseline.json")
+
+ROUTES = [
+    ("GET", "/dashboard"),
+    ("GET", "/attendance"),
+    ("GET", "/study-planner"),
+    ("GET", "/weekly-danger"),
+    ("GET", "/profile"),
+    ("GET", "/deadlines"),
+    ("POST", "/mark-attendance"),
+]
+CONFIG_KEYS = ("users", "subjects", "days", "clients", "requests")
+
+
+def run_benchmark(args):
+    from bench_storage import percentile
+
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import app as college_app
+    from seed_data import seed
+
+    db = college_app.connect_db()
+    seed(db, users=args.users, subjects_per_user=args.subjects, days=args.days)
+    college_app.rebuild_attendance_stats(db)
+    db.commit()
+    db.close()
+
+    flask_app = college_app.app
+    statements = [0]
+
+    def count_statement(sql):
+        statements[0] += 1
+
+    @flask_app.before_request
+    def trace_statements():
+        college_app.get_db().set_trace_callback(count_statement)
+
+    @flask_app.teardown_request
+    def untrace_statements(exception):
+        db = college_app.g.get("db")
+        if db is not None:
+            db.set_trace_callback(None)
+
+    rng = random.Random(7)
+    clients = []
+    for index in range(min(args.clients, args.users)):
+        client = flask_app.test_client()
+        client.post("/login", data={"name": f"bench{index}", "password": "bench"})
+        clients.append((client, index * args.subjects + 1))
+
+    def request_once(client, subject_id, method, path):
+        if method == "POST":
+            day = date.today() - timedelta(days=rng.randrange(1, args.days))
+            return client.post(
+                path,
+                json={"subject_id": subject_id, "date": day.isoformat(), "status": rng.choice(["present", "absent"])},
+            )
+        return client.get(path)
+
+    for client, subject_id in clients:
+        for method, path in ROUTES:
+            request_once(client, subject_id, method, path)
+
+    samples = {path: [] for _, path in ROUTES}
+    queries = {path: [] for _, path in ROUTES}
+    errors = {path: 0 for _, path in ROUTES}
+    for iteration in range(args.requests):
+        client, subject_id = clients[iteration % len(clients)]
+        for method, path in ROUTES:
+            statements[0] = 0
+            started = time.perf_counter()
+            response = request_once(client, subject_id, method, path)
+            samples[path].append(time.perf_counter() - started)
+            queries[path].append(statements[0])
+            errors[path] += response.status_code >= 400
+
+    return {
+        "config": {key: getattr(args, key) for key in CONFIG_KEYS},
+        "routes": {
+            path: {
+                "requests": len(samples[path]),
+                "errors": errors[path],
+                "p50_ms": round(percentile(samples[path], 50) * 1000, 2),
+                "p95_ms": round(percentile(samples[path], 95) * 1000, 2),
+                "p99_ms": round(percentile(samples[path], 99) * 1000, 2),
+                "mean_ms": round(statistics.fmean(samples[path]) * 1000, 2),
+                "sql_per_request": round(statistics.fmean(queries[path]), 1),
+                "sql_max": max(queries[path]),
+            }
+            for _, path in ROUTES
+        },
+    }
+
+
+def compare(report, baseline, tolerance):
+    if baseline["config"] != report["config"]:
+        # Another data size changes both timings and statement counts, so nothing is gated.
+        print(f"note: baseline was recorded with {baseline['config']}; shown for reference, not compared")
+        return []
+    regressions = []
+    for path, stats in report["routes"].items():
+        previous = baseline["routes"].get(path)
+        if previous is None:
+            continue
+        if stats["sql_per_request"] > previous["sql_per_request"]:
+            regressions.append(f"{path}: {previous['sql_per_request']} -> {stats['sql_per_request']} statements per request")
+        # The median is steady enough run to run; tail percentiles are shown but not gated.
+        # Sub-millisecond jitter on routes that are already fast is ignored.
+        slower_by = stats["p50_ms"] - previous["p50_ms"]
+        if slower_by > 0.5 and stats["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{path}: p50 {previous['p50_ms']} ms -> {stats['p50_ms']} ms")
+        if stats["errors"] > previous["errors"]:
+            regressions.append(f"{path}: {previous['errors']} -> {stats['errors']} errors")
+    return regressions
+
+
+def print_report(report, baseline):
+    previous_routes = baseline["routes"] if baseline else {}
+    for path, stats in report["routes"].items():
+        previous = previous_routes.get(path)
+        line = (
+            f"  {path:<18} p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  "
+            f"p99 {stats['p99_ms']:>8} ms  sql {stats['sql_per_request']:>6}  errors {stats['errors']}"
+        )
+        if previous:
+            line += f"   (baseline p50 {previous['p50_ms']} ms, sql {previous['sql_per_request']})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--clients", type=int, default=5, help="Logged-in users that take turns sending requests.")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per route.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown before it counts.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # app.py reads DATABASE_PATH at import, so set it before run_benchmark imports the app.
+        os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+        report = run_benchmark(args)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if baseline:
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Compare SQLite storage profiles under concurrent dashboard reads and attendance writes.
+
+Each profile runs in its own Python process against a fresh temporary
+database, because app.py reads DB_STORAGE_PROFILE and DATABASE_PATH at import.
+
+    python bench_storage.py --users 30 --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, errors, seconds):
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / seconds, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+def run_profile(args):
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import app as college_app
+
+    from seed_data import seed
+
+    db = college_app.connect_db()
+    seed(db, users=args.users, subjects_per_user=args.subjects, days=args.days)
+    college_app.rebuild_attendance_stats(db)
+    db.commit()
+    db.close()
+
+    flask_app = college_app.app
+    deadline = [0.0]
+    results = {"dashboard": [], "mark_attendance": []}
+    errors = {"dashboard": 0, "mark_attendance": 0}
+    lock = threading.Lock()
+
+    def start_clock():
+        deadline[0] = time.perf_counter() + args.seconds
+
+    # Logging in hashes a password, so start the clock only once every client is ready.
+    ready = threading.Barrier(args.readers + args.writers, action=start_clock)
+
+    def login(client, user_index):
+        client.post("/login", data={"name": f"bench{user_index}", "password": "bench"})
+
+    def reader(worker):
+        client = flask_app.test_client()
+        login(client, worker % args.users)
+        ready.wait()
+        samples, failed = [], 0
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            response = client.get("/dashboard")
+            samples.append(time.perf_counter() - started)
+            failed += response.status_code != 200
+        with lock:
+            results["dashboard"].extend(samples)
+            errors["dashboard"] += failed
+
+    def writer(worker):
+        rng = random.Random(worker)
+        client = flask_app.test_client()
+        user_index = (worker + args.readers) % args.users
+        login(client, user_index)
+        subject_id = user_index * args.subjects + 1
+        ready.wait()
+        samples, failed = [], 0
+        while time.perf_counter() < deadline[0]:
+            day = date.today() - timedelta(days=rng.randrange(args.days))
+            started = time.perf_counter()
+            response = client.post(
+                "/mark-attendance",
+                json={"subject_id": subject_id, "date": day.isoformat(), "status": rng.choice(["present", "absent"])},
+            )
+            samples.append(time.perf_counter() - started)
+            failed += response.status_code != 204
+        with lock:
+            results["mark_attendance"].extend(samples)
+            errors["mark_attendance"] += failed
+
+    threads = [threading.Thread(target=reader, args=(index,)) for index in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(index,)) for index in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {name: summarize(samples, errors[name], args.seconds) for name, samples in results.items()}
+    report["pool"] = college_app.db_pool.stats()
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["synced", "server"])
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--subjects", type=int, default=10)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--run-profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args)
+        return
+
+    forwarded = [
+        f"--users={args.users}",
+        f"--subjects={args.subjects}",
+        f"--days={args.days}",
+        f"--readers={args.readers}",
+        f"--writers={args.writers}",
+        f"--seconds={args.seconds}",
+    ]
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                DB_STORAGE_PROFILE=profile,
+                DATABASE_PATH=os.path.join(workdir, "bench.db"),
+            )
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), f"--run-profile={profile}", *forwarded],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"== {profile} ==")
+        for name in ("dashboard", "mark_attendance"):
+            stats = report[name]
+            print(
+                f"  {name:<16} {stats['requests']:>6} req  {stats['rps']:>8} req/s  "
+                f"p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms  "
+                f"p99 {stats['p99_ms']:>7} ms  errors {stats['errors']}"
+            )
+        print(f"  pool             wait avg {report['pool']['wait_avg_ms']} ms, max {report['pool']['wait_max_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
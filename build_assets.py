@@ -0,0 +1,173 @@
+"""Build the fingerprinted CSS and JS bundles the templates link to.
+
+Sources live in assets/. Every bundle is the concatenation of its source
+files, named after a hash of its content, and written to static/dist with
+gzip and brotli copies next to it, so the server never compresses on the
+fly. static/dist/manifest.json maps bundle names to the hashed file names
+the asset_url template helper links to. The files of the build before it
+are kept, listed in manifest.previous.json, so pages rendered by a worker
+that has not restarted yet still load their bundles during a deploy.
+
+    python build_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+try:
+    import brotli
+except ImportError:  # Listed in requirements.txt; build() refuses to run without it.
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the single-process dev server runs there.
+    fcntl = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(REPO_DIR, "assets")
+OUTPUT_DIR = os.path.join(REPO_DIR, "static", "dist")
+MANIFEST_NAME = "manifest.json"
+PREVIOUS_MANIFEST_NAME = "manifest.previous.json"
+LOCK_NAME = ".build.lock"
+
+# Bundle name -> source files under assets/, concatenated in this order.
+# base.* is linked by every page that extends base.html; the rest by one page each.
+BUNDLES = {
+    "base.css": ["css/style.css", "css/base.css"],
+    "base.js": ["js/base.js"],
+    "attendance.css": ["css/attendance.css"],
+    "attendance.js": ["js/attendance.js"],
+    "attendance_calendar.css": ["css/attendance_calendar.css"],
+    "attendance_calendar.js": ["js/attendance_calendar.js"],
+    "dashboard.css": ["css/dashboard.css"],
+    "dashboard.js": ["js/dashboard.js"],
+    "deadlines.css": ["css/deadlines.css"],
+    "forgot_password.css": ["css/forgot_password.css"],
+    "login.css": ["css/login.css"],
+    "login.js": ["js/login.js"],
+    "profile.css": ["css/profile.css"],
+    "profile.js": ["js/profile.js"],
+    "register.css": ["css/register.css"],
+    "study_planner.css": ["css/study_planner.css"],
+    "subjects.css": ["css/subjects.css"],
+    "timetable.css": ["css/timetable.css"],
+    "weekly_danger.css": ["css/weekly_danger.css"],
+}
+
+
+def source_paths():
+    return [os.path.join(SOURCE_DIR, source) for sources in BUNDLES.values() for source in sources]
+
+
+def is_stale(output_dir=OUTPUT_DIR):
+    """True when the manifest is missing or older than a source file or this script."""
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return True
+    built_at = os.path.getmtime(manifest_path)
+    return any(os.path.getmtime(path) > built_at for path in [*source_paths(), os.path.abspath(__file__)])
+
+
+def read_manifest(output_dir=OUTPUT_DIR, name=MANIFEST_NAME):
+    try:
+        with open(os.path.join(output_dir, name)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def write_atomic(path, data):
+    # Readers, such as a worker loading the manifest, only ever see whole files.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(temp_path, path)
+
+
+def write_manifest(output_dir, name, manifest):
+    write_atomic(os.path.join(output_dir, name), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+
+@contextmanager
+def build_lock(output_dir=OUTPUT_DIR):
+    # gunicorn workers import the app at the same time; the first one builds and
+    # the rest wait here, then find the manifest fresh.
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, LOCK_NAME), "w") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def build_if_stale(output_dir=OUTPUT_DIR):
+    """Build unless the manifest is already newer than every source. Safe to call from many processes."""
+    if not is_stale(output_dir):
+        return
+    with build_lock(output_dir):
+        if is_stale(output_dir):
+            build(output_dir)
+
+
+def build(output_dir=OUTPUT_DIR):
+    """Write every bundle and its compressed copies, then the manifest. Returns the manifest."""
+    if brotli is None:
+        raise RuntimeError("The brotli package is required to build assets: pip install -r requirements.txt")
+    os.makedirs(output_dir, exist_ok=True)
+    current = read_manifest(output_dir)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(SOURCE_DIR, source), "rb") as handle:
+                parts.append(handle.read().strip())
+        content = b"\n\n".join(parts) + b"\n"
+
+        stem, extension = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+        manifest[name] = filename
+        path = os.path.join(output_dir, filename)
+        if os.path.exists(path):
+            continue
+        write_atomic(path, content)
+        # mtime=0 keeps the .gz identical between builds of the same content.
+        write_atomic(f"{path}.gz", gzip.compress(content, compresslevel=9, mtime=0))
+        write_atomic(f"{path}.br", brotli.compress(content, quality=11))
+
+    # The manifest being replaced becomes the previous generation; rebuilding
+    # unchanged sources leaves the previous generation as it was.
+    if current and current != manifest:
+        previous = current
+        write_manifest(output_dir, PREVIOUS_MANIFEST_NAME, previous)
+    else:
+        previous = read_manifest(output_dir, PREVIOUS_MANIFEST_NAME)
+    write_manifest(output_dir, MANIFEST_NAME, manifest)
+
+    # Anything older than the previous generation is no longer linked from any page.
+    keep = {*manifest.values(), *previous.values(), MANIFEST_NAME, PREVIOUS_MANIFEST_NAME, LOCK_NAME}
+    for filename in os.listdir(output_dir):
+        base = filename.removesuffix(".gz").removesuffix(".br")
+        if base not in keep and not filename.endswith(".tmp"):
+            os.remove(os.path.join(output_dir, filename))
+    return manifest
+
+
+def main():
+    with build_lock():
+        manifest = build()
+    sizes = []
+    for name, filename in sorted(manifest.items()):
+        path = os.path.join(OUTPUT_DIR, filename)
+        sizes.append(
+            f"  {name:<26} {filename:<40} {os.path.getsize(path):>7} B"
+            f"  gzip {os.path.getsize(path + '.gz'):>6} B  br {os.path.getsize(path + '.br'):>6} B"
+        )
+    print("\n".join(sizes))
+    print(f"{len(manifest)} bundles written to {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
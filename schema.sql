@@ -14,7 +14,7 @@ CREATE TABLE IF NOT EXISTS subjects (
     attendance_required_percent INTEGER DEFAULT 75,
     attendance_weight INTEGER DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS attendance (
@@ -22,7 +22,7 @@ CREATE TABLE IF NOT EXISTS attendance (
     subject_id INTEGER NOT NULL,
     date TEXT NOT NULL,
     status TEXT NOT NULL,
-    FOREIGN KEY (subject_id) REFERENCES subjects(id)
+    FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS deadlines (
@@ -33,7 +33,7 @@ CREATE TABLE IF NOT EXISTS deadlines (
     type TEXT,
     priority TEXT DEFAULT 'medium',
     completed INTEGER DEFAULT 0,
-    FOREIGN KEY (subject_id) REFERENCES subjects(id)
+    FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS timetable (
@@ -46,15 +46,15 @@ CREATE TABLE IF NOT EXISTS timetable (
     start_time TEXT,
     end_time TEXT,
     room TEXT,
-    FOREIGN KEY (subject_id) REFERENCES subjects(id),
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS settings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER UNIQUE,
     min_attendance INTEGER DEFAULT 75,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS click_log (
@@ -62,7 +62,7 @@ CREATE TABLE IF NOT EXISTS click_log (
     user_id INTEGER,
     page TEXT,
     timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 CREATE TABLE IF NOT EXISTS study_plan_progress (
@@ -72,5 +72,5 @@ CREATE TABLE IF NOT EXISTS study_plan_progress (
     completed INTEGER DEFAULT 1,
     updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(user_id, session_key),
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -0,0 +1,182 @@
+"""Fill a database with synthetic students for load and scaling tests.
+
+Every user gets subjects with a weekly timetable, a few extra classes,
+deadlines around today and a semester of daily attendance on their
+scheduled weekdays. All users share one password so benchmarks can log in.
+
+    python seed_data.py --database load.db --users 500 --subjects 8 --days 120
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUBJECT_NAMES = [
+    "Mathematics", "Physics", "Chemistry", "Data Structures", "Operating Systems",
+    "Databases", "Networks", "Economics", "Statistics", "Electronics",
+    "Algorithms", "Compiler Design", "Machine Learning", "Ethics",
+]
+DEADLINE_TYPES = ["assignment", "exam", "quiz", "project"]
+PRIORITIES = ["low", "medium", "high"]
+SLOTS = [("09:00", "10:00"), ("10:15", "11:15"), ("11:30", "12:30"), ("13:30", "14:30"), ("14:45", "15:45")]
+
+
+def seed(
+    db,
+    users=30,
+    subjects_per_user=8,
+    days=120,
+    extra_classes=2,
+    deadlines_per_subject=4,
+    prefix="bench",
+    password="bench",
+    rng_seed=42,
+):
+    """Insert the synthetic rows through db and return how many of each were written.
+
+    The rollup tables are not touched; callers run rebuild_attendance_stats afterwards.
+    """
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(password)
+    rng = random.Random(rng_seed)
+    today = date.today()
+    semester = [today - timedelta(days=offset) for offset in range(days, 0, -1)]
+    offset = db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    counts = {"users": 0, "subjects": 0, "timetable": 0, "attendance": 0, "deadlines": 0}
+
+    for index in range(offset, offset + users):
+        cur = db.execute(
+            "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+            (f"{prefix}{index}", f"{prefix}{index}@example.com", password_hash),
+        )
+        user_id = cur.lastrowid
+        db.execute(
+            "INSERT INTO settings (user_id, min_attendance) VALUES (?, ?)",
+            (user_id, rng.choice([70, 75, 80])),
+        )
+        diligence = rng.uniform(0.65, 0.97)
+        counts["users"] += 1
+
+        for subject_index in range(subjects_per_user):
+            cur = db.execute(
+                """
+                INSERT INTO subjects (user_id, name, credits, attendance_required_percent, attendance_weight)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    user_id,
+                    SUBJECT_NAMES[subject_index % len(SUBJECT_NAMES)],
+                    rng.choice([2, 3, 4]),
+                    rng.choice([60, 75, 80]),
+                    rng.choice([1, 1, 2]),
+                ),
+            )
+            subject_id = cur.lastrowid
+            counts["subjects"] += 1
+
+            weekdays = sorted(rng.sample(range(5), rng.randint(2, 4)))
+            timetable_rows = []
+            for weekday in weekdays:
+                start_time, end_time = rng.choice(SLOTS)
+                timetable_rows.append(
+                    (subject_id, weekday, user_id, 0, None, start_time, end_time, f"R{rng.randint(101, 420)}")
+                )
+            extra_dates = [today + timedelta(days=rng.randint(-days, 14)) for _ in range(extra_classes)]
+            timetable_rows += [
+                (subject_id, -1, user_id, 1, day.isoformat(), None, None, None) for day in extra_dates
+            ]
+            db.executemany(
+                """
+                INSERT INTO timetable (subject_id, weekday, user_id, is_extra, class_date, start_time, end_time, room)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                timetable_rows,
+            )
+            counts["timetable"] += len(timetable_rows)
+
+            class_days = {day for day in semester if day.weekday() in weekdays}
+            class_days.update(day for day in extra_dates if day < today)
+            attendance_rows = []
+            for day in sorted(class_days):
+                roll = rng.random()
+                if roll < 0.03:
+                    status = "cancelled"
+                elif roll < 0.03 + diligence * 0.97:
+                    status = "present"
+                else:
+                    status = "absent"
+                attendance_rows.append((subject_id, day.isoformat(), status))
+            db.executemany("INSERT INTO attendance (subject_id, date, status) VALUES (?, ?, ?)", attendance_rows)
+            counts["attendance"] += len(attendance_rows)
+
+            deadline_rows = []
+            for deadline_index in range(deadlines_per_subject):
+                due = today + timedelta(days=rng.randint(-21, 28))
+                deadline_type = rng.choice(DEADLINE_TYPES)
+                deadline_rows.append(
+                    (
+                        subject_id,
+                        f"{deadline_type.title()} {deadline_index + 1}",
+                        due.isoformat(),
+                        deadline_type,
+                        rng.choice(PRIORITIES),
+                        int(due < today and rng.random() < 0.8),
+                    )
+                )
+            db.executemany(
+                """
+                INSERT INTO deadlines (subject_id, title, due_date, type, priority, completed)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                deadline_rows,
+            )
+            counts["deadlines"] += len(deadline_rows)
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=None, help="SQLite file to fill; defaults to DATABASE_PATH or college.db.")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--subjects", type=int, default=8, help="Subjects per user.")
+    parser.add_argument("--days", type=int, default=120, help="Days of attendance history, ending yesterday.")
+    parser.add_argument("--extra-classes", type=int, default=2, help="Extra classes per subject.")
+    parser.add_argument("--deadlines", type=int, default=4, help="Deadlines per subject.")
+    parser.add_argument("--prefix", default="bench", help="User names are prefix + number.")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_PATH"] = args.database
+    # Importing the app creates the schema and runs the migrations on the target file.
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+    import app as college_app
+
+    db = college_app.connect_db()
+    counts = seed(
+        db,
+        users=args.users,
+        subjects_per_user=args.subjects,
+        days=args.days,
+        extra_classes=args.extra_classes,
+        deadlines_per_subject=args.deadlines,
+        prefix=args.prefix,
+        password=args.password,
+        rng_seed=args.seed,
+    )
+    college_app.rebuild_attendance_stats(db)
+    db.commit()
+    db.close()
+    print(", ".join(f"{count} {name}" for name, count in counts.items()), f"written to {college_app.DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
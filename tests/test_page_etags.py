@@ -0,0 +1,117 @@
+"""Conditional GET: unchanged pages answer 304, and every write changes the ETag."""
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# app.py reads DATABASE_PATH at import, so point it at a scratch file first.
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "etags.db")
+sys.path.insert(0, REPO_DIR)
+
+import app as college_app  # noqa: E402
+
+PAGES = ["/dashboard", "/attendance", "/deadlines", "/deadlines/archive", "/study-planner", "/profile"]
+
+
+def make_user(name):
+    client = college_app.app.test_client()
+    client.post("/register", data={"name": name, "email": f"{name}@example.com", "password": "pw", "confirm": "pw"})
+    client.post("/login", data={"name": name, "password": "pw"})
+    client.post("/add-subject", data={"name": "Physics", "credits": "3", "attendance_required": "75"})
+    db = college_app.connect_db()
+    subject_id = db.execute(
+        "SELECT subjects.id FROM subjects JOIN users ON users.id = subjects.user_id WHERE users.name = ?",
+        (name,),
+    ).fetchone()[0]
+    db.close()
+    # The profile write below renames the user; keep the name predictable for it.
+    client.post("/profile", data={"name": f"etag-user{subject_id}", "email": f"{name}@example.com"})
+    return client, subject_id
+
+
+def etags(client):
+    tags = {}
+    for page in PAGES:
+        response = client.get(page)
+        assert response.status_code == 200, page
+        tags[page] = response.headers["ETag"]
+    return tags
+
+
+def assert_not_modified(client, tags):
+    for page, tag in tags.items():
+        response = client.get(page, headers={"If-None-Match": tag})
+        assert response.status_code == 304, page
+        assert response.headers["ETag"] == tag
+
+
+def assert_modified(client, tags):
+    for page, tag in tags.items():
+        response = client.get(page, headers={"If-None-Match": tag})
+        assert response.status_code == 200, page
+        assert response.headers["ETag"] != tag, page
+
+
+@pytest.fixture(scope="module")
+def users():
+    return make_user("etag-alice"), make_user("etag-bob")
+
+
+def test_matching_etag_gets_304(users):
+    (client, _), _ = users
+    assert_not_modified(client, etags(client))
+
+
+WRITES = {
+    "mark-attendance": lambda client, subject_id: client.post(
+        "/mark-attendance",
+        json={"subject_id": subject_id, "date": date.today().isoformat(), "status": "present"},
+    ),
+    "add-deadline": lambda client, subject_id: client.post(
+        "/add-deadline",
+        data={
+            "subject_id": subject_id,
+            "title": "Lab report",
+            "due_date": (date.today() + timedelta(days=2)).isoformat(),
+            "type": "assignment",
+            "priority": "high",
+        },
+    ),
+    # Each user keeps their own name and changes only the email.
+    "profile": lambda client, subject_id: client.post(
+        "/profile", data={"name": f"etag-user{subject_id}", "email": f"user{subject_id}@example.org"}
+    ),
+    "timetable-week": lambda client, subject_id: client.post(
+        "/timetable/week", json={"subjects": {str(subject_id): [{"weekday": 1, "start_time": "09:00"}]}}
+    ),
+    "mark-attendance-batch": lambda client, subject_id: client.post(
+        "/mark-attendance/batch",
+        json={
+            "marks": [
+                {"subject_id": subject_id, "date": (date.today() - timedelta(days=1)).isoformat(), "status": "absent"}
+            ]
+        },
+    ),
+}
+
+
+@pytest.mark.parametrize("write", WRITES)
+def test_write_changes_etag(users, write):
+    (client, subject_id), _ = users
+    tags = etags(client)
+    response = WRITES[write](client, subject_id)
+    assert response.status_code < 400
+    assert_modified(client, tags)
+
+
+@pytest.mark.parametrize("write", WRITES)
+def test_other_users_write_keeps_etag(users, write):
+    (client, _), (other_client, other_subject_id) = users
+    tags = etags(client)
+    response = WRITES[write](other_client, other_subject_id)
+    assert response.status_code < 400
+    assert_not_modified(client, tags)